@@ -11,17 +11,19 @@ for key, value in st.secrets.items():
         os.environ[key] = value # we are basically setting as env vars anything related to openai and qdrant
 
 # Import from your existing utils
-from utils.rag import rag
-from utils.prompts import USCIS_OFFICER_SYSTEM_PROMPT, USCIS_OFFICER_USER_PROMPT
 from utils.streamlit import (
-    US_LOCATIONS, 
-    RAG_CONFIG,
+    LOCATION_OPTIONS, 
     reset_quiz_state, 
     reset_all_state, 
     check_test_completion, 
     log_feedback,
     load_questions,
-    get_test_requirements)
+    load_question_embeddings,
+    get_test_requirements,
+    get_cached_evaluation,
+    pick_unasked_question,
+    prefetch_context,
+    stream_evaluation)
 
 # Page config (must be first Streamlit command)
 st.set_page_config(
@@ -34,10 +36,26 @@ st.set_page_config(
 # SESSION STATE INITIALIZATION
 # ============================================================================
 
-if 'setup_complete' not in st.session_state:
-    st.session_state.setup_complete = False
-    st.session_state.user_state = None
-    st.session_state.test_year = None
+SETUP_DEFAULTS = {
+    'setup_complete': False,
+    'user_state': None,
+    'test_year': None,
+}
+
+# Quiz progress (the current question and its RNG are set up separately, once questions are loaded)
+QUIZ_DEFAULTS = {
+    'answered': False,
+    'total_attempted': 0,
+    'total_correct': 0,
+    'total_incorrect': 0,
+    'question_counter': 0,
+    'test_complete': False,
+    'test_passed': False,
+    'feedback_given': False,
+}
+
+for key, value in SETUP_DEFAULTS.items():
+    st.session_state.setdefault(key, value)
 
 # ============================================================================
 # SETUP SCREEN
@@ -55,7 +73,7 @@ if not st.session_state.setup_complete:
     
     selected_state = st.selectbox(
         "Select your location:",
-        options=[""] + US_LOCATIONS,
+        options=LOCATION_OPTIONS,
         index=0,
         key="state_selector"
     )
@@ -101,19 +119,37 @@ if not st.session_state.setup_complete:
 # MAIN APP - Quiz Interface
 # ============================================================================
 
+# Bind session state once; frequently read values are hoisted into locals below
+ss = st.session_state
+year = ss.test_year
+
 # Load questions based on the selected test year
-questions = load_questions(st.session_state.test_year)
+questions = load_questions(year)
 
 # Safety check
-if not questions:
+if not questions.text:
     st.error("❌ Failed to load questions. Please refresh the page or contact support.")
     st.stop()
 
+# Asked questions are tracked by index into the bank
+total_questions = len(questions.text)
+
+# Embed all questions once so submitting an answer doesn't need an extra embeddings call
+question_embeddings = None
+if ss.get('embeddings_failed_year') != year:
+    try:
+        question_embeddings = load_question_embeddings(year)
+    except Exception as e:
+        # Fall back to embedding each question at submit time; failures aren't cached,
+        # so remember this one instead of retrying the embeddings call on every rerun
+        ss.embeddings_failed_year = year
+        st.warning(f"⚠️ Could not precompute question embeddings, answers may take a little longer to check: {e}")
+
 # Display setup info in sidebar
 with st.sidebar:
     st.header("📋 Your Test Info")
-    st.write(f"**State:** {st.session_state.user_state}")
-    st.write(f"**Test Version:** {st.session_state.test_year} Civics Test")
+    st.write(f"**State:** {ss.user_state}")
+    st.write(f"**Test Version:** {year} Civics Test")
     
     st.write("---")
     
@@ -127,36 +163,45 @@ with st.sidebar:
 
 # Main app title
 st.title("🇺🇸 USCIS Citizenship Test Preparation")
-st.write(f"Practicing with the **{st.session_state.test_year} Civics Test**")
+st.write(f"Practicing with the **{year} Civics Test**")
 
 # Initialize quiz session state
-if 'question' not in st.session_state:
-    st.session_state.question = random.choice(questions)
-    st.session_state.answered = False
-    st.session_state.total_attempted = 0
-    st.session_state.total_correct = 0
-    st.session_state.total_incorrect = 0
-    st.session_state.question_counter = 0
-    st.session_state.asked_questions = [st.session_state.question]
-    st.session_state.test_complete = False
-    st.session_state.test_passed = False
-    st.session_state.feedback_given = False
+for key, value in QUIZ_DEFAULTS.items():
+    ss.setdefault(key, value)
+
+if 'question_idx' not in ss:
+    # Per-session RNG; the seed is kept so a question sequence can be reproduced when debugging
+    ss.rng_seed = int.from_bytes(os.urandom(8), "big")
+    ss.rng = random.Random(ss.rng_seed)
+    ss.question_idx = ss.rng.randrange(total_questions)
+    ss.asked_idx = {ss.question_idx}
+
+# Hoist the values read throughout the render below (writes still go to ss)
+question_idx = ss.question_idx
+question_text = questions.text[question_idx]
+question_answers = questions.answers[question_idx]
+question_embedding = question_embeddings[question_idx] if question_embeddings is not None else None
+answered = ss.answered
+correct = ss.total_correct
+incorrect = ss.total_incorrect
+attempted = ss.total_attempted
+question_counter = ss.question_counter
+test_reqs = get_test_requirements(year)
 
 # CHECK IF TEST IS COMPLETE - Show completion screen
-if st.session_state.test_complete:
-    if st.session_state.test_passed:
+if ss.test_complete:
+    if ss.test_passed:
         st.balloons()  # Celebrate!
         st.success("# 🎉 Congratulations! You Passed!")
-        st.write(f"You answered **{st.session_state.total_correct}** questions correctly!")
+        st.write(f"You answered **{correct}** questions correctly!")
         st.write("You're ready for your citizenship test! 🇺🇸")
     else:
         st.error("# 📚 Keep Practicing!")
-        st.write(f"You got **{st.session_state.total_incorrect}** questions wrong.")
+        st.write(f"You got **{incorrect}** questions wrong.")
         st.write("Don't worry, practice makes perfect!")
     
     # Show test details
-    test_reqs = get_test_requirements(st.session_state.test_year)
-    st.info(f"**{test_reqs['name']} Rules:**\n- Need {test_reqs['passing']} correct out of {test_reqs['total']} questions\n- You got {st.session_state.total_correct} correct")
+    st.info(f"**{test_reqs['name']} Rules:**\n- Need {test_reqs['passing']} correct out of {test_reqs['total']} questions\n- You got {correct} correct")
 
     st.write("---")
     
@@ -167,181 +212,201 @@ if st.session_state.test_complete:
     
     st.stop()  # Don't show the quiz interface
 
-# Display question
-st.subheader("Question:")
-st.write(st.session_state.question.get('question', 'No question found'))
+# Retrieve the question's context in the background while the user types their answer
+if not answered and ss.get('context_question') != question_text:
+    ss.context_future = prefetch_context(question_text, question_embedding)
+    ss.context_question = question_text
+
+# The quiz panel reruns on its own while typing an answer or giving feedback; Submit and Next
+# rerun the whole app because they change the progress shown in the sidebar
+@st.fragment
+def quiz_panel():
+    answered = ss.answered
+
+    # Display question
+    st.subheader("Question:")
+    st.write(question_text or 'No question found')
+
+    # Answer input with unique key based on question counter
+    user_answer = st.text_input(
+        "Your answer:",
+        disabled=answered,
+        key=f"answer_input_{question_counter}"
+    )
 
-# Answer input with unique key based on question counter
-user_answer = st.text_input(
-    "Your answer:",
-    disabled=st.session_state.answered,
-    key=f"answer_input_{st.session_state.question_counter}"
-)
+    # Create button row with Submit, Next/Results, and Feedback buttons
+    col1, col2, col3, col4 = st.columns([2, 2, 0.5, 0.5])
+
+    with col1:
+        if st.button("Submit Answer", disabled=answered or not user_answer.strip()):
+
+            # Identical repeat submissions come straight from the cache
+            result = get_cached_evaluation(question_text, question_answers, ss.user_state, user_answer)
+
+            if result is None:
+                # Use the prefetched context; if retrieval failed, rag retrieves it again
+                try:
+                    context = ss.context_future.result()
+                except Exception as e:
+                    print(f"Context prefetch failed: {e}")
+                    context = None
+
+                # Stream the evaluation while it's generated; it is shown formatted after the rerun below
+                result = {}
+                with st.status("Evaluating your answer...") as status:
+                    st.write_stream(stream_evaluation(
+                        question=question_text,
+                        answers=question_answers,
+                        user_state=ss.user_state,
+                        user_answer=user_answer,
+                        result=result,
+                        question_embedding=question_embedding,
+                        context=context
+                    ))
+                    status.update(state="error" if 'error' in result else "complete")
 
-# Create button row with Submit, Next/Results, and Feedback buttons
-col1, col2, col3, col4 = st.columns([2, 2, 0.5, 0.5])
-
-with col1:
-    if st.button("Submit Answer", disabled=st.session_state.answered or not user_answer.strip()):
-
-        with st.spinner("Evaluating your answer..."):
-            # Call your RAG function
-            result = rag(
-                user_prompt=USCIS_OFFICER_USER_PROMPT,
-                system_prompt=USCIS_OFFICER_SYSTEM_PROMPT,
-                question=st.session_state.question.get('question', ''),
-                answers=st.session_state.question.get('answers', ''),
-                user_state=st.session_state.user_state,
-                user_answer=user_answer,
-                **RAG_CONFIG
-            )
-            
             # Store results in session state
-            st.session_state.result = result
-            st.session_state.user_answer_text = user_answer
+            ss.result = result
+            ss.user_answer_text = user_answer
 
             # Store LLM metadata for logging
             if 'metadata' in result:
-                st.session_state.llm_metadata = result['metadata']
+                ss.llm_metadata = result['metadata']
+
+            ss.answered = True
+            ss.total_attempted += 1
+            ss.feedback_given = False 
 
-            st.session_state.answered = True
-            st.session_state.total_attempted += 1
-            st.session_state.feedback_given = False 
-            
             # Check if passed - FIXED: removed .lower()
             if 'error' not in result:
                 success = result.get('success', False)
                 if success:
-                    st.session_state.total_correct += 1
+                    ss.total_correct += 1
                 else:
-                    st.session_state.total_incorrect += 1
-                
-                # Check if test is complete
-                check_test_completion()
-            
-            st.rerun()
+                    ss.total_incorrect += 1
 
-with col2:
-    # Check if test WOULD BE complete (but don't set state yet)
-    would_be_complete, would_pass = check_test_completion()
+            st.rerun(scope="app")
 
-    # Determine button text and type based on test completion status
-    if would_be_complete and st.session_state.answered:
-        button_text = "📊 See Test Results"
-        button_type = "primary"
+    with col2:
+        # Check if test WOULD BE complete (but don't set state yet)
+        would_be_complete, would_pass = check_test_completion(correct, incorrect, year)
+
+        # Determine button text and type based on test completion status
+        if would_be_complete and answered:
+            button_text = "📊 See Test Results"
+            button_type = "primary"
+        else:
+            button_text = "Next Question"
+            button_type = "secondary"
+
+        if st.button(button_text, disabled=not answered, type=button_type):
+            # If test WOULD BE complete, set the state and show results
+            if would_be_complete:
+                ss.test_complete = True
+                ss.test_passed = would_pass
+                st.rerun(scope="app")
+            else:
+                # Continue to next question, picked from the unasked ones
+                next_idx = pick_unasked_question(ss.rng, total_questions, ss.asked_idx)
+
+                # If all questions asked, reset and start over
+                if next_idx is None:
+                    ss.asked_idx = set()
+                    next_idx = ss.rng.randrange(total_questions)
+                    st.toast("🎉 You've completed all questions! Starting over...")
+
+                ss.question_idx = next_idx
+                ss.asked_idx.add(next_idx)
+
+                ss.answered = False
+                ss.question_counter = question_counter + 1
+                ss.feedback_given = False
+                if 'result' in ss:
+                    del ss.result
+                if 'user_answer_text' in ss:
+                    del ss.user_answer_text
+                st.rerun(scope="app")
+
+    with col3:
+        # Thumbs up button - disabled until answer is submitted and no feedback given yet
+        thumbs_up_disabled = not answered or ss.feedback_given
+        if st.button("👍", disabled=thumbs_up_disabled, key=f"thumbs_up_{question_counter}", help="Good bot"):
+            log_feedback('positive', question_text, question_answers)
+            st.toast("✅ Thanks for your feedback!")
+            st.rerun(scope="fragment")
+
+    with col4:
+        # Thumbs down button - disabled until answer is submitted and no feedback given yet
+        thumbs_down_disabled = not answered or ss.feedback_given
+        if st.button("👎", disabled=thumbs_down_disabled, key=f"thumbs_down_{question_counter}", help="Bad bot"):
+            log_feedback('negative', question_text, question_answers)
+            st.toast("📝 Thanks for your feedback!")
+            st.rerun(scope="fragment")
+
+    # Show feedback confirmation
+    if answered and ss.feedback_given:
+        st.caption("✓ Feedback recorded - thank you!")
+    elif answered:
+        st.caption("Was this evaluation helpful? 👍 👎")
     else:
-        button_text = "Next Question"
-        button_type = "secondary"
-
-    if st.button(button_text, disabled=not st.session_state.answered, type=button_type):
-        # If test WOULD BE complete, set the state and show results
-        if would_be_complete:
-            st.session_state.test_complete = True
-            st.session_state.test_passed = would_pass
-            st.rerun()
+        st.caption("Answer the question to provide feedback")
+
+    # Show results if answered
+    if answered and 'result' in ss:
+        result = ss.result
+
+        # Check for errors
+        if 'error' in result:
+            st.error(f"❌ Error: {result['error']}")
         else:
-            # Continue to next question
-            # Get list of unasked questions
-            unasked = [q for q in questions if q not in st.session_state.asked_questions]
-            
-            # If all questions asked, reset and start over
-            if not unasked:
-                st.session_state.asked_questions = []
-                unasked = questions
-                st.toast("🎉 You've completed all questions! Starting over...")
-            
-            # Pick from unasked questions
-            st.session_state.question = random.choice(unasked)
-            st.session_state.asked_questions.append(st.session_state.question)
-            
-            st.session_state.answered = False
-            st.session_state.question_counter += 1
-            st.session_state.feedback_given = False
-            if 'result' in st.session_state:
-                del st.session_state.result
-            if 'user_answer_text' in st.session_state:
-                del st.session_state.user_answer_text
-            st.rerun()
+            # Display results
+            success = result.get('success', False)
+            reason = result.get('reason', '')
+            background_info = result.get('background_info', '')
+
+            # Show reason with tick or X
+            if success:
+                st.success(f"✅ {reason}")
+            else:
+                st.error(f"❌ {reason}")
 
-with col3:
-    # Thumbs up button - disabled until answer is submitted and no feedback given yet
-    thumbs_up_disabled = not st.session_state.answered or st.session_state.feedback_given
-    if st.button("👍", disabled=thumbs_up_disabled, key=f"thumbs_up_{st.session_state.question_counter}", help="Good bot"):
-        log_feedback('positive')
-        st.toast("✅ Thanks for your feedback!")
-        st.rerun()
+            # Show user's answer
+            st.info(f"**Your answer:** {ss.user_answer_text}")
 
-with col4:
-    # Thumbs down button - disabled until answer is submitted and no feedback given yet
-    thumbs_down_disabled = not st.session_state.answered or st.session_state.feedback_given
-    if st.button("👎", disabled=thumbs_down_disabled, key=f"thumbs_down_{st.session_state.question_counter}", help="Bad bot"):
-        log_feedback('negative')
-        st.toast("📝 Thanks for your feedback!")
-        st.rerun()
+            # Show correct answer
+            st.info(f"**Correct answer(s):** {question_answers or 'N/A'}")
 
-# Show feedback confirmation
-if st.session_state.answered and st.session_state.feedback_given:
-    st.caption("✓ Feedback recorded - thank you!")
-elif st.session_state.answered:
-    st.caption("Was this evaluation helpful? 👍 👎")
-else:
-    st.caption("Answer the question to provide feedback")
-
-# Show results if answered
-if st.session_state.answered and 'result' in st.session_state:
-    result = st.session_state.result
-    
-    # Check for errors
-    if 'error' in result:
-        st.error(f"❌ Error: {result['error']}")
-    else:
-        # Display results
-        success = result.get('success', False)
-        reason = result.get('reason', '')
-        background_info = result.get('background_info', '')
-
-        # Show reason with tick or X
-        if success:
-            st.success(f"✅ {reason}")
-        else:
-            st.error(f"❌ {reason}")
-        
-        # Show user's answer
-        st.info(f"**Your answer:** {st.session_state.user_answer_text}")
-        
-        # Show correct answer
-        st.info(f"**Correct answer(s):** {st.session_state.question.get('answers', 'N/A')}")
-        
-        # Background info in a box
-        st.write("---")
-        st.info(f"📚 **Did you know?**\n\n{background_info}")
+            # Background info in a box
+            st.write("---")
+            st.info(f"📚 **Did you know?**\n\n{background_info}")
+
+
+quiz_panel()
 
       
 # Sidebar with stats
 with st.sidebar:
     st.header("📊 Your Progress")
     
-    if st.session_state.total_attempted > 0:
-        accuracy = (st.session_state.total_correct / st.session_state.total_attempted) * 100
+    if attempted > 0:
+        accuracy = (correct / attempted) * 100
         # Show test-specific progress
-        test_reqs = get_test_requirements(st.session_state.test_year)
         st.write(f"**{test_reqs['name']} Progress:**")
         st.write(f"- Need {test_reqs['passing']} correct to pass")
         st.write(f"- Can miss up to {test_reqs['total'] - test_reqs['passing']} questions")
         col1, col2 = st.columns(2)
         with col1:
-            st.metric("✅ Correct", st.session_state.total_correct)
+            st.metric("✅ Correct", correct)
         with col2:
-            st.metric("❌ Incorrect", st.session_state.total_incorrect)
+            st.metric("❌ Incorrect", incorrect)
         
         st.write("---")
         
-        st.metric("Questions Attempted", st.session_state.total_attempted)
+        st.metric("Questions Attempted", attempted)
         st.metric("Accuracy", f"{accuracy:.1f}%")
         
         # Show progress through question bank
-        total_questions = len(questions)
-        questions_seen = len(st.session_state.asked_questions)
+        questions_seen = len(ss.asked_idx)
         st.progress(questions_seen / total_questions)
         st.caption(f"{questions_seen} of {total_questions} questions seen")
     else:
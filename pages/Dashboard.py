@@ -1,11 +1,16 @@
+import io
 import streamlit as st
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from datetime import date, datetime, timedelta
 import plotly.graph_objects as go
 import plotly.express as px
-import psycopg2
-from utils.evaluation import convert_to_binary
+from plotly.subplots import make_subplots
+from psycopg2 import sql
+from utils.evaluation import binarize_scores
+from utils.streamlit import db_connection
 
 # Page config
 st.set_page_config(
@@ -18,270 +23,210 @@ st.set_page_config(
 # DATA LOADING FROM NEON POSTGRES
 # ============================================================================
 
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def load_metrics_from_db(days=30):
-    """Load daily metrics summary from Neon Postgres"""
-    try:
-        # Get database URL from Streamlit secrets
-        database_url = st.secrets["database"]["url"]
-        
-        # Connect to database
-        conn = psycopg2.connect(database_url)
-        
-        # Calculate date range
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days)
-        
-        # Query daily metrics
-        query = """
-            SELECT 
-                date,
-                feedback_count,
-                positive_feedback_rate,
-                mean_background_word_count,
-                mean_similarity,
-                grading_context_pass_rate,
-                grading_accuracy_pass_rate,
-                background_quality_pass_rate,
-                background_context_pass_rate
-            FROM daily_metrics_summary
-            WHERE date >= %s AND date <= %s
-            ORDER BY date ASC
-        """
-        
-        df = pd.read_sql(query, conn, params=(start_date, end_date))
-        conn.close()
-        
-        return df
-        
-    except Exception as e:
-        st.error(f"Error loading data from database: {e}")
-        return pd.DataFrame()  # Return empty DataFrame on error
-
-@st.cache_data(ttl=300)  # Cache for 5 minutes
-def load_individual_evaluations(days=30):
-    """Load individual evaluations from Neon Postgres"""
-    try:
-        # Get database URL from Streamlit secrets
-        database_url = st.secrets["database"]["url"]
-        
-        # Connect to database
-        conn = psycopg2.connect(database_url)
-        
-        # Calculate date range
-        end_date = datetime.now().date()
-        start_date = end_date - timedelta(days=days)
-        
-        # Query daily metrics
-        query = """
-            SELECT 
-                evaluation_date,
-                question,
-                correct_answers,
-                user_answer,
-                user_feedback,
-                background_word_count,
-                reason_background_similarity,
-                grading_context_score,
-                grading_context_reason,
-                grading_accuracy_score,
-                grading_accuracy_reason,
-                background_quality_score,
-                background_quality_reason,
-                background_context_score,
-                background_context_reason,
-                feedback_timestamp
-            FROM evaluations
-            WHERE evaluation_date >= %s AND evaluation_date <= %s
-            ORDER BY feedback_timestamp ASC
-        """
-        
-        df = pd.read_sql(query, conn, params=(start_date, end_date))
-        conn.close()
-        
-        return df
-        
-    except Exception as e:
-        st.error(f"Error loading data from database: {e}")
-        return pd.DataFrame()  # Return empty DataFrame on error
+# Every column the individual evaluations loader may select (also guards the column names spliced into SQL)
+EVALUATION_COLUMNS = (
+    'evaluation_date',
+    'question',
+    'correct_answers',
+    'user_answer',
+    'user_feedback',
+    'background_word_count',
+    'reason_background_similarity',
+    'grading_context_score',
+    'grading_context_reason',
+    'grading_accuracy_score',
+    'grading_accuracy_reason',
+    'background_quality_score',
+    'background_quality_reason',
+    'background_context_score',
+    'background_context_reason',
+    'feedback_timestamp'
+)
 
+# Columns the Individual Data Points and Distributions tabs actually plot (no long text fields)
+PLOTTED_EVALUATION_COLUMNS = (
+    'user_feedback',
+    'background_word_count',
+    'reason_background_similarity',
+    'grading_context_score',
+    'grading_accuracy_score',
+    'background_quality_score',
+    'background_context_score',
+    'feedback_timestamp'
+)
 
-# ============================================================================
-# MAIN DASHBOARD
-# ============================================================================
+# Columns of the evaluations table that only ever hold a handful of distinct labels
+CATEGORICAL_COLUMNS = [
+    'user_feedback',
+    'grading_context_score',
+    'grading_accuracy_score',
+    'background_quality_score',
+    'background_context_score'
+]
 
-st.title("📊 Bot Evaluation Dashboard")
-st.write("Track daily performance metrics based on user feedback")
+# Float columns of daily_metrics_summary (all rates in [0, 1] or small means)
+DAILY_FLOAT_COLUMNS = [
+    'positive_feedback_rate',
+    'mean_background_word_count',
+    'mean_similarity',
+    'grading_context_pass_rate',
+    'grading_accuracy_pass_rate',
+    'background_quality_pass_rate',
+    'background_context_pass_rate'
+]
 
-# Sidebar filters
-with st.sidebar:
-    st.header("⚙️ Filters")
-    
-    # Date range selector
-    date_range = st.selectbox(
-        "Select time range:",
-        options=["Last 7 days", "Last 14 days", "Last 30 days", "Last 90 days"],
-        index=2
-    )
-    
-    # Map selection to days
-    days_map = {
-        "Last 7 days": 7,
-        "Last 14 days": 14,
-        "Last 30 days": 30,
-        "Last 90 days": 90
-    }
-    selected_days = days_map[date_range]
+# LLM judge metrics; each has a {metric}_score label column in the evaluations table
+JUDGE_METRICS = ('grading_context', 'grading_accuracy', 'background_quality', 'background_context')
+
+# Rows fetched per round trip by the server-side cursor
+FETCH_CHUNK_SIZE = 10000
+
+def read_sql_arrow_chunked(conn, query, params, chunk_size=FETCH_CHUNK_SIZE):
+    """
+    Run a query through a server-side cursor and build an Arrow-backed DataFrame chunk by chunk,
+    so at most chunk_size rows exist as Python tuples at any time.
+    """
+    tables = []
+    with conn.cursor(name="dashboard_chunked_read") as cur:
+        cur.itersize = chunk_size
+        cur.execute(query, params)
+        
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            # A named cursor only knows its columns once something has been fetched
+            columns = [column.name for column in cur.description]
+            if not rows:
+                break
+            tables.append(pa.Table.from_arrays(
+                [pa.array(values) for values in zip(*rows)],
+                names=columns
+            ))
     
-    st.write("---")
+    if not tables:
+        return pd.DataFrame(columns=columns)
     
-    # Refresh button
-    if st.button("🔄 Refresh Data"):
-        st.cache_data.clear()
-        st.rerun()
-    
-    st.caption("💡 Tip: Metrics are calculated daily from user feedback (👍/👎)")
-    st.caption("🔄 Data is cached for 5 minutes. Click 'Refresh Data' to force update.")
-
-# Load data from database
-with st.spinner("Loading metrics from database..."):
-    df = load_metrics_from_db(days=selected_days)
-    df_individual = load_individual_evaluations(days=selected_days)
-
-# Check if data was loaded
-if df.empty:
-    st.warning("⚠️ No evaluation data found. Run the evaluation script to generate metrics.")
-    st.code("python scripts/evaluate.py --date 2025-10-16", language="bash")
-    st.stop()
-
-# Display data info
-st.success(f"✅ Loaded {len(df)} days of evaluation data")
-
-# Calculate summary stats for the selected period
-latest_data = df.iloc[-1]
-previous_data = df.iloc[-2] if len(df) > 1 else latest_data
-
-# ============================================================================
-# METRIC CARDS - Row 1: Quantitative Metrics
-# ============================================================================
-
-st.subheader("📈 Quantitative Metrics")
-
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    current_feedback = latest_data['positive_feedback_rate']
-    prev_feedback = previous_data['positive_feedback_rate']
-    delta_feedback = current_feedback - prev_feedback
+    # Chunks whose column was all NULL have type null; promote them to the other chunks' type
+    table = pa.concat_tables(tables, promote_options="default")
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+def read_daily_metrics(conn, start_date, end_date):
+    """Daily metrics summary rows between the two dates, oldest first"""
+    query = """
+        SELECT 
+            date,
+            feedback_count,
+            positive_feedback_rate,
+            mean_background_word_count,
+            mean_similarity,
+            grading_context_pass_rate,
+            grading_accuracy_pass_rate,
+            background_quality_pass_rate,
+            background_context_pass_rate
+        FROM daily_metrics_summary
+        WHERE date >= %s AND date <= %s
+        ORDER BY date ASC
+    """
+    df = pd.read_sql(query, conn, params=(start_date, end_date))
+    # Rates and means never need double precision
+    df[DAILY_FLOAT_COLUMNS] = df[DAILY_FLOAT_COLUMNS].astype('float32')
+    return df
+
+def binary_scores(scores):
+    """binarize_scores for a categorical score column: converts the categories once and maps the codes"""
+    # Missing values have code -1, which picks the trailing NaN
+    lookup = np.append(binarize_scores(pd.Series(scores.cat.categories)).to_numpy(), np.float32(np.nan))
+    return pd.Series(lookup[scores.cat.codes.to_numpy()], index=scores.index)
+
+def read_individual_evaluations(conn, start_date, end_date, columns=EVALUATION_COLUMNS):
+    """Individual evaluations between the two dates (only the given columns), in feedback order"""
+    unknown = set(columns) - set(EVALUATION_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown evaluation columns: {sorted(unknown)}")
     
-    st.metric(
-        label="Positive Feedback Rate",
-        value=f"{current_feedback:.1%}",
-        delta=f"{delta_feedback:+.1%}",
-        help="Percentage of 👍 ratings vs total feedback"
-    )
-
-with col2:
-    current_words = latest_data['mean_background_word_count']
-    prev_words = previous_data['mean_background_word_count']
-    delta_words = current_words - prev_words
+    # Query only the requested columns
+    query = sql.SQL("""
+        SELECT {columns}
+        FROM evaluations
+        WHERE evaluation_date >= %s AND evaluation_date <= %s
+        ORDER BY feedback_timestamp ASC
+    """).format(columns=sql.SQL(", ").join(map(sql.Identifier, columns))).as_string(conn)
     
-    st.metric(
-        label="Background Info Word Count",
-        value=f"{current_words:.1f}",
-        delta=f"{delta_words:+.1f}",
-        help="Average number of words in background information"
-    )
-
-with col3:
-    current_sim = latest_data['mean_similarity']
-    prev_sim = previous_data['mean_similarity']
-    delta_sim = current_sim - prev_sim
+    # Arrow-backed dtypes: the question/answer/reason text columns take far less memory than Python strings
+    df = read_sql_arrow_chunked(conn, query, (start_date, end_date))
     
-    st.metric(
-        label="Reason-Background Similarity",
-        value=f"{current_sim:.2f}",
-        delta=f"{delta_sim:+.2f}",
-        help="Semantic similarity between reasoning and background info"
-    )
-
-st.write("---")
-
-# ============================================================================
-# METRIC CARDS - Row 2: Qualitative Metrics (LLM-as-Judge)
-# ============================================================================
-
-st.subheader("🤖 Qualitative Metrics (LLM-as-Judge)")
-
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    current = latest_data['grading_context_pass_rate']
-    prev = previous_data['grading_context_pass_rate']
-    delta = current - prev
+    # Low-cardinality labels (Yes/No, Good/Bad, positive/negative) are stored as small integer codes
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
     
-    st.metric(
-        label="Grading Context Usage",
-        value=f"{current:.1%}",
-        delta=f"{delta:+.1%}",
-        help="Proper use of context in grading (Yes rate)"
-    )
-
-with col2:
-    current = latest_data['grading_accuracy_pass_rate']
-    prev = previous_data['grading_accuracy_pass_rate']
-    delta = current - prev
+    if df.empty:
+        return df
     
-    st.metric(
-        label="Grading Accuracy",
-        value=f"{current:.1%}",
-        delta=f"{delta:+.1%}",
-        help="Quality of grading decisions (Good rate)"
-    )
-
-with col3:
-    current = latest_data['background_quality_pass_rate']
-    prev = previous_data['background_quality_pass_rate']
-    delta = current - prev
+    # Derived plotting columns, computed once here so the cached frame already carries them
+    for metric in JUDGE_METRICS:
+        if f'{metric}_score' in df.columns:
+            df[f'{metric}_binary'] = binary_scores(df[f'{metric}_score'])
+    if 'feedback_timestamp' in df.columns:
+        df['feedback_time_str'] = df['feedback_timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S')
     
-    st.metric(
-        label="Background Quality",
-        value=f"{current:.1%}",
-        delta=f"{delta:+.1%}",
-        help="Quality of background information (Good rate)"
-    )
+    return df
 
-with col4:
-    current = latest_data['background_context_pass_rate']
-    prev = previous_data['background_context_pass_rate']
-    delta = current - prev
+@st.cache_data(ttl=300)  # Cache for 5 minutes (per days and columns)
+def load_dashboard_data(days=30, individual_columns=None):
+    """
+    Load the daily metrics summary and, if individual_columns is given, those columns of the
+    individual evaluations from Neon Postgres, both over a single connection.
     
-    st.metric(
-        label="Background Context Usage",
-        value=f"{current:.1%}",
-        delta=f"{delta:+.1%}",
-        help="Background uses retrieved context (Yes rate)"
-    )
+    Returns:
+        (daily metrics DataFrame, individual evaluations DataFrame or None)
+    """
+    try:
+        # Calculate date range
+        end_date = date.today()
+        start_date = end_date - timedelta(days=days)
+        
+        # Borrow one connection from the shared pool for both queries (returned even if a query fails)
+        with db_connection() as conn:
+            df = read_daily_metrics(conn, start_date, end_date)
+            df_individual = None
+            if individual_columns is not None:
+                df_individual = read_individual_evaluations(conn, start_date, end_date, individual_columns)
+        
+        return df, df_individual
+        
+    except Exception as e:
+        st.error(f"Error loading data from database: {e}")
+        # Return empty DataFrames on error
+        return pd.DataFrame(), (pd.DataFrame() if individual_columns is not None else None)
 
-st.write("---")
 
 # ============================================================================
-# TREND CHARTS
+# CHART BUILDERS (cached so reruns reuse the figures for the same data)
 # ============================================================================
 
-st.subheader("📊 Metric Trends Over Time")
-
-# Create tabs for different metric groups
-tab1, tab2, tab3 = st.tabs(["Daily Aggregates", "Individual Data Points", "Distributions"])
-
-with tab1:
-    st.markdown("**Daily aggregated metrics from `daily_metrics_summary` table**")
+def data_fingerprint(df):
+    """
+    Cache key for a frame passed to the chart builders as an unhashed argument: a hash of its
+    contents, so recomputed rows (e.g. same-day daily summaries) invalidate the cached figures.
+    """
+    if df is None or df.empty:
+        return (0, None)
+    return (len(df), int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+@st.cache_data(ttl=300)  # Keyed on days and a fingerprint of the data it is built from
+def build_daily_figures(days, fingerprint, _df):
+    """Build the Daily Aggregates tab figures from the daily metrics of the last `days` days"""
+    # Pull the columns out of the frame once; the traces take plain numpy arrays
+    x_dates = _df['date'].to_numpy()
+    feedback_pct = _df['positive_feedback_rate'].to_numpy(dtype=float) * 100
+    word_counts = _df['mean_background_word_count'].to_numpy(dtype=float)
+    similarities = _df['mean_similarity'].to_numpy(dtype=float)
     
     # Positive Feedback Rate Chart
     fig1 = go.Figure()
-    fig1.add_trace(go.Scatter(
-        x=df['date'],
-        y=df['positive_feedback_rate'] * 100,
+    fig1.add_trace(go.Scattergl(
+        x=x_dates,
+        y=feedback_pct,
         mode='lines+markers',
         name='Positive Feedback Rate',
         line=dict(color='#2ecc71', width=2),
@@ -294,21 +239,20 @@ with tab1:
         hovermode='x unified',
         height=300
     )
-    st.plotly_chart(fig1, use_container_width=True)
     
     # Background Word Count & Similarity
     fig2 = go.Figure()
-    fig2.add_trace(go.Scatter(
-        x=df['date'],
-        y=df['mean_background_word_count'],
+    fig2.add_trace(go.Scattergl(
+        x=x_dates,
+        y=word_counts,
         mode='lines+markers',
         name='Avg Word Count',
         yaxis='y',
         line=dict(color='#3498db', width=2)
     ))
-    fig2.add_trace(go.Scatter(
-        x=df['date'],
-        y=df['mean_similarity'],
+    fig2.add_trace(go.Scattergl(
+        x=x_dates,
+        y=similarities,
         mode='lines+markers',
         name='Similarity Score',
         yaxis='y2',
@@ -322,7 +266,6 @@ with tab1:
         hovermode='x unified',
         height=300
     )
-    st.plotly_chart(fig2, use_container_width=True)
     
     # All qualitative metrics in one chart
     fig3 = go.Figure()
@@ -334,10 +277,13 @@ with tab1:
         ('background_context_pass_rate', 'Background Context Usage', '#34495e')
     ]
     
-    for metric_col, metric_name, color in metrics:
-        fig3.add_trace(go.Scatter(
-            x=df['date'],
-            y=df[metric_col] * 100,
+    # One (days x metrics) array of percentages sharing the date array
+    ys = _df[[metric_col for metric_col, _, _ in metrics]].to_numpy(dtype=float) * 100
+    
+    for i, (metric_col, metric_name, color) in enumerate(metrics):
+        fig3.add_trace(go.Scattergl(
+            x=x_dates,
+            y=ys[:, i],
             mode='lines+markers',
             name=metric_name,
             line=dict(width=2, color=color),
@@ -358,286 +304,393 @@ with tab1:
             x=1
         )
     )
-    st.plotly_chart(fig3, use_container_width=True)
-
-with tab2:
-    st.markdown("**Individual evaluation records from `evaluations` table**")
     
-    if df_individual.empty:
-        st.warning("No individual evaluation data available.")
-    else:
-        # Convert LLM judge scores to binary
-        df_individual['grading_context_binary'] = df_individual['grading_context_score'].apply(convert_to_binary)
-        df_individual['grading_accuracy_binary'] = df_individual['grading_accuracy_score'].apply(convert_to_binary)
-        df_individual['background_quality_binary'] = df_individual['background_quality_score'].apply(convert_to_binary)
-        df_individual['background_context_binary'] = df_individual['background_context_score'].apply(convert_to_binary)
-        
-        # Color scheme
-        colors = {'positive': '#2ecc71', 'negative': '#e74c3c'}
-        
-        st.markdown("### Quantitative Metrics Over Time")
+    return fig1, fig2, fig3
 
-        # Scatter plot: Background Word Count over time
-        fig4 = go.Figure()
-        
-        for feedback_type in df_individual['user_feedback'].unique():
-            subset = df_individual[df_individual['user_feedback'] == feedback_type]
-            fig4.add_trace(go.Scatter(
-                x=subset['feedback_timestamp'],  # Use actual timestamp
-                y=subset['background_word_count'],
+
+def numeric_array(values):
+    """Float NumPy array of a (possibly Arrow-backed, nullable) numeric column, NULLs as NaN"""
+    return values.to_numpy(dtype=float, na_value=np.nan)
+
+
+# LLM judge scatter panels: (metric, title, y axis title, tick labels for 0 and 1), laid out two per row
+JUDGE_PANELS = [
+    ('grading_context', "Grading Context Usage", "Binary Score (0=No, 1=Yes)", ['No', 'Yes']),
+    ('grading_accuracy', "Grading Accuracy", "Binary Score (0=Bad, 1=Good)", ['Bad', 'Good']),
+    ('background_quality', "Background Info Quality", "Binary Score (0=Bad, 1=Good)", ['Bad', 'Good']),
+    ('background_context', "Background Context Usage", "Binary Score (0=No, 1=Yes)", ['No', 'Yes']),
+]
+
+
+@st.cache_data(ttl=300)
+def build_individual_figures(days, fingerprint, _df_individual):
+    """Build the Individual Data Points tab figures: (word count / similarity subplots, judge score scatters)"""
+    df_individual = _df_individual
+    
+    # Color scheme
+    colors = {'positive': '#2ecc71', 'negative': '#e74c3c'}
+    # Split by feedback type once (in order of first appearance) and reuse the groups for every figure
+    feedback_groups = list(df_individual.groupby('user_feedback', sort=False, observed=True))
+    # NumPy arrays (not Series) per group, so plotly ships them to the browser as base64 typed arrays
+    timestamps = {
+        feedback_type: subset['feedback_timestamp'].to_numpy(dtype='datetime64[ms]')
+        for feedback_type, subset in feedback_groups
+    }
+    
+    # Background Word Count and Similarity over time, stacked on one shared feedback-time axis
+    fig_quantitative = make_subplots(
+        rows=2, cols=1,
+        shared_xaxes=True,
+        vertical_spacing=0.08,
+        subplot_titles=(
+            "Background Word Count - Individual Evaluations (by Feedback Time)",
+            "Reason-Background Similarity - Individual Evaluations (by Feedback Time)"
+        )
+    )
+    quantitative_rows = [
+        (1, 'background_word_count', 'Word Count: %{y}'),
+        (2, 'reason_background_similarity', 'Similarity: %{y:.3f}'),
+    ]
+    
+    for row, col_name, value_hover in quantitative_rows:
+        for feedback_type, subset in feedback_groups:
+            fig_quantitative.add_trace(go.Scattergl(
+                x=timestamps[feedback_type],  # Use actual timestamp
+                y=numeric_array(subset[col_name]),
                 mode='markers',
                 name=f'{feedback_type.capitalize()} Feedback',
+                legendgroup=feedback_type,  # One legend entry toggles both rows
+                showlegend=(row == 1),
                 marker=dict(
                     size=8,
                     color=colors.get(feedback_type, '#95a5a6'),
                     opacity=0.6
                 ),
-                text=subset['feedback_timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S'),
-                hovertemplate='<b>%{text}</b><br>Word Count: %{y}<extra></extra>'
-            ))
-        
-        fig4.update_layout(
-            title="Background Word Count - Individual Evaluations (by Feedback Time)",
-            xaxis_title="Feedback Timestamp",
-            yaxis_title="Word Count",
-            hovermode='closest',
-            height=350
-        )
-        st.plotly_chart(fig4, use_container_width=True)
-        
-        # Scatter plot: Similarity over time
-        fig5 = go.Figure()
+                text=subset['feedback_time_str'],
+                hovertemplate=f'<b>%{{text}}</b><br>{value_hover}<extra></extra>'
+            ), row=row, col=1)
+    
+    fig_quantitative.update_xaxes(title_text="Feedback Timestamp", row=2, col=1)
+    fig_quantitative.update_yaxes(title_text="Word Count", row=1, col=1)
+    fig_quantitative.update_yaxes(title_text="Similarity Score", row=2, col=1)
+    fig_quantitative.update_layout(
+        hovermode='closest',
+        height=700
+    )
+    
+    # Scatter plots for the LLM judge metrics (one per JUDGE_PANELS entry)
+    judge_figs = []
+    
+    for metric, title, yaxis_title, ticktext in JUDGE_PANELS:
+        fig = go.Figure()
         
-        for feedback_type in df_individual['user_feedback'].unique():
-            subset = df_individual[df_individual['user_feedback'] == feedback_type]
-            fig5.add_trace(go.Scatter(
-                x=subset['feedback_timestamp'],  # Use actual timestamp
-                y=subset['reason_background_similarity'],
+        for feedback_type, subset in feedback_groups:
+            fig.add_trace(go.Scattergl(
+                x=timestamps[feedback_type],
+                y=subset[f'{metric}_binary'].to_numpy(),
                 mode='markers',
                 name=f'{feedback_type.capitalize()} Feedback',
                 marker=dict(
-                    size=8,
+                    size=10,
                     color=colors.get(feedback_type, '#95a5a6'),
                     opacity=0.6
                 ),
-                text=subset['feedback_timestamp'].dt.strftime('%Y-%m-%d %H:%M:%S'),
-                hovertemplate='<b>%{text}</b><br>Similarity: %{y:.3f}<extra></extra>'
+                text=subset[f'{metric}_score'],
+                hovertemplate='<b>%{x}</b><br>Score: %{text}<br>Binary: %{y}<extra></extra>'
             ))
         
-        fig5.update_layout(
-            title="Reason-Background Similarity - Individual Evaluations (by Feedback Time)",
+        fig.update_layout(
+            title=title,
             xaxis_title="Feedback Timestamp",
-            yaxis_title="Similarity Score",
+            yaxis_title=yaxis_title,
+            yaxis=dict(tickvals=[0, 1], ticktext=ticktext),
             hovermode='closest',
-            height=350
+            height=300
         )
-        st.plotly_chart(fig5, use_container_width=True)
+        judge_figs.append(fig)
+    
+    return fig_quantitative, judge_figs
 
-        st.write("---")
-        st.markdown("### LLM-as-Judge Metrics Over Time")
-        
-        # Create 2x2 grid for LLM judge metrics
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            # Scatter plot: Grading Context Usage
-            fig6 = go.Figure()
-            
-            for feedback_type in df_individual['user_feedback'].unique():
-                subset = df_individual[df_individual['user_feedback'] == feedback_type]
-                fig6.add_trace(go.Scatter(
-                    x=subset['feedback_timestamp'],
-                    y=subset['grading_context_binary'],
-                    mode='markers',
-                    name=f'{feedback_type.capitalize()} Feedback',
-                    marker=dict(
-                        size=10,
-                        color=colors.get(feedback_type, '#95a5a6'),
-                        opacity=0.6
-                    ),
-                    text=subset['grading_context_score'],
-                    hovertemplate='<b>%{x}</b><br>Score: %{text}<br>Binary: %{y}<extra></extra>'
-                ))
+
+def histogram_bar(values, bins, **bar_kwargs):
+    """Histogram binned here with NumPy and drawn as a bar per bin, so only the bin counts reach the browser"""
+    counts, edges = np.histogram(values[~np.isnan(values)], bins=bins)
+    return go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        **bar_kwargs
+    )
+
+
+@st.cache_data(ttl=300)
+def build_distribution_figures(days, fingerprint, _df_individual):
+    """Build the Distributions tab figures: (word count and similarity histograms, judge score count plots)"""
+    df_individual = _df_individual
+    
+    # Histogram: Background Word Count
+    fig_words = go.Figure()
+    fig_words.add_trace(histogram_bar(
+        numeric_array(df_individual['background_word_count']),
+        bins=20,
+        marker_color='#3498db',
+        opacity=0.7,
+        name='Word Count'
+    ))
+    fig_words.update_layout(
+        title="Distribution of Background Word Count",
+        xaxis_title="Word Count",
+        yaxis_title="Frequency",
+        height=300
+    )
+    
+    # Histogram: Similarity
+    fig_similarity = go.Figure()
+    fig_similarity.add_trace(histogram_bar(
+        numeric_array(df_individual['reason_background_similarity']),
+        bins=20,
+        marker_color='#e74c3c',
+        opacity=0.7,
+        name='Similarity'
+    ))
+    fig_similarity.update_layout(
+        title="Distribution of Similarity Scores",
+        xaxis_title="Similarity Score",
+        yaxis_title="Frequency",
+        height=300
+    )
+    
+    # Count plots: LLM Judge Scores
+    score_cols = [
+        ('grading_context_score', 'Context Usage'),
+        ('grading_accuracy_score', 'Grading Accuracy'),
+        ('background_quality_score', 'Background Quality'),
+        ('background_context_score', 'Background Context')
+    ]
+    score_figs = []
+    
+    for col_name, title in score_cols:
+        if col_name in df_individual.columns:
+            counts = df_individual[col_name].value_counts().sort_index()
             
-            fig6.update_layout(
-                title="Grading Context Usage",
-                xaxis_title="Feedback Timestamp",
-                yaxis_title="Binary Score (0=No, 1=Yes)",
-                yaxis=dict(tickvals=[0, 1], ticktext=['No', 'Yes']),
-                hovermode='closest',
-                height=300
+            fig = go.Figure(data=[
+                go.Bar(
+                    x=counts.index,
+                    y=counts.values,
+                    marker_color='#9b59b6',
+                    opacity=0.7
+                )
+            ])
+            fig.update_layout(
+                title=title,
+                xaxis_title="Score",
+                yaxis_title="Count",
+                height=250
             )
-            st.plotly_chart(fig6, use_container_width=True)
-        
-        with col2:
-            # Scatter plot: Grading Accuracy
-            fig7 = go.Figure()
-            
-            for feedback_type in df_individual['user_feedback'].unique():
-                subset = df_individual[df_individual['user_feedback'] == feedback_type]
-                fig7.add_trace(go.Scatter(
-                    x=subset['feedback_timestamp'],
-                    y=subset['grading_accuracy_binary'],
-                    mode='markers',
-                    name=f'{feedback_type.capitalize()} Feedback',
-                    marker=dict(
-                        size=10,
-                        color=colors.get(feedback_type, '#95a5a6'),
-                        opacity=0.6
-                    ),
-                    text=subset['grading_accuracy_score'],
-                    hovertemplate='<b>%{x}</b><br>Score: %{text}<br>Binary: %{y}<extra></extra>'
-                ))
-            
-            fig7.update_layout(
-                title="Grading Accuracy",
-                xaxis_title="Feedback Timestamp",
-                yaxis_title="Binary Score (0=Bad, 1=Good)",
-                yaxis=dict(tickvals=[0, 1], ticktext=['Bad', 'Good']),
-                hovermode='closest',
-                height=300
+            score_figs.append(fig)
+    
+    return (fig_words, fig_similarity), score_figs
+
+
+@st.cache_data(ttl=300)
+def metrics_csv_bytes(days, fingerprint, _df):
+    """The daily metrics of the last `days` days as CSV bytes for the download button (written by Arrow's C++ CSV writer)"""
+    buffer = io.BytesIO()
+    pa_csv.write_csv(
+        pa.Table.from_pandas(_df, preserve_index=False),
+        buffer,
+        write_options=pa_csv.WriteOptions(quoting_style="needed")
+    )
+    return buffer.getvalue()
+
+
+# ============================================================================
+# MAIN DASHBOARD
+# ============================================================================
+
+# Time ranges (in days) offered in the sidebar
+DAY_RANGES = (7, 14, 30, 90)
+DEFAULT_DAYS = 30
+
+# Timestamp of this run, shared by the CSV file name and the footer
+now = datetime.now()
+
+st.title("📊 Bot Evaluation Dashboard")
+st.write("Track daily performance metrics based on user feedback")
+
+# Sidebar filters
+with st.sidebar:
+    st.header("⚙️ Filters")
+    
+    # Date range selector (options are the number of days)
+    selected_days = st.segmented_control(
+        "Select time range:",
+        options=DAY_RANGES,
+        default=DEFAULT_DAYS,
+        format_func=lambda days: f"Last {days} days"
+    )
+    
+    # Clicking the selected option again clears it; keep showing the default range then
+    if selected_days is None:
+        selected_days = DEFAULT_DAYS
+    
+    # Individual evaluations (with their long LLM reasons) are only fetched when asked for
+    show_individual = st.toggle(
+        "Load individual evaluations",
+        value=False,
+        key="show_individual",
+        help="Needed for the Individual Data Points and Distributions tabs"
+    )
+    
+    st.write("---")
+    
+    # Refresh button
+    if st.button("🔄 Refresh Data"):
+        st.cache_data.clear()
+        st.rerun()
+    
+    st.caption("💡 Tip: Metrics are calculated daily from user feedback (👍/👎)")
+    st.caption("🔄 Data is cached for 5 minutes. Click 'Refresh Data' to force update.")
+
+# Load data from database
+with st.spinner("Loading metrics from database..."):
+    df, df_individual = load_dashboard_data(
+        days=selected_days,
+        individual_columns=PLOTTED_EVALUATION_COLUMNS if show_individual else None
+    )
+
+# Check if data was loaded
+if df.empty:
+    st.warning("⚠️ No evaluation data found. Run the evaluation script to generate metrics.")
+    st.code("python scripts/evaluate.py --date 2025-10-16", language="bash")
+    st.stop()
+
+# Display data info
+st.success(f"✅ Loaded {len(df)} days of evaluation data")
+
+# Metric cards: (column, label, number format, help) per card
+QUANTITATIVE_CARDS = [
+    ('positive_feedback_rate', "Positive Feedback Rate", '.1%', "Percentage of 👍 ratings vs total feedback"),
+    ('mean_background_word_count', "Background Info Word Count", '.1f', "Average number of words in background information"),
+    ('mean_similarity', "Reason-Background Similarity", '.2f', "Semantic similarity between reasoning and background info"),
+]
+QUALITATIVE_CARDS = [
+    ('grading_context_pass_rate', "Grading Context Usage", '.1%', "Proper use of context in grading (Yes rate)"),
+    ('grading_accuracy_pass_rate', "Grading Accuracy", '.1%', "Quality of grading decisions (Good rate)"),
+    ('background_quality_pass_rate', "Background Quality", '.1%', "Quality of background information (Good rate)"),
+    ('background_context_pass_rate', "Background Context Usage", '.1%', "Background uses retrieved context (Yes rate)"),
+]
+
+def metric_cards(cards, latest, previous):
+    """One st.metric per card in a row of columns, with the change since the previous day as delta"""
+    keys = [key for key, _, _, _ in cards]
+    current = latest[keys].to_numpy(dtype=float)
+    delta = current - previous[keys].to_numpy(dtype=float)
+    
+    for col, (_, label, fmt, help_text), value, change in zip(st.columns(len(cards)), cards, current, delta):
+        with col:
+            st.metric(
+                label=label,
+                value=format(value, fmt),
+                delta=format(change, '+' + fmt),
+                help=help_text
             )
-            st.plotly_chart(fig7, use_container_width=True)
-        
-        col3, col4 = st.columns(2)
+
+# Calculate summary stats for the selected period
+latest_data = df.iloc[-1]
+previous_data = df.iloc[-2] if len(df) > 1 else latest_data
+
+# ============================================================================
+# METRIC CARDS - Row 1: Quantitative Metrics
+# ============================================================================
+
+st.subheader("📈 Quantitative Metrics")
+
+metric_cards(QUANTITATIVE_CARDS, latest_data, previous_data)
+
+st.write("---")
+
+# ============================================================================
+# METRIC CARDS - Row 2: Qualitative Metrics (LLM-as-Judge)
+# ============================================================================
+
+st.subheader("🤖 Qualitative Metrics (LLM-as-Judge)")
+
+metric_cards(QUALITATIVE_CARDS, latest_data, previous_data)
+
+st.write("---")
+
+# ============================================================================
+# TREND CHARTS
+# ============================================================================
+
+st.subheader("📊 Metric Trends Over Time")
+
+# Create tabs for different metric groups
+tab1, tab2, tab3 = st.tabs(["Daily Aggregates", "Individual Data Points", "Distributions"])
+
+with tab1:
+    st.markdown("**Daily aggregated metrics from `daily_metrics_summary` table**")
+    
+    fig1, fig2, fig3 = build_daily_figures(selected_days, data_fingerprint(df), df)
+    
+    st.plotly_chart(fig1, use_container_width=True)
+    st.plotly_chart(fig2, use_container_width=True)
+    st.plotly_chart(fig3, use_container_width=True)
+
+with tab2:
+    st.markdown("**Individual evaluation records from `evaluations` table**")
+    
+    if df_individual is None:
+        st.info("Turn on **Load individual evaluations** in the sidebar to see this tab.")
+    elif df_individual.empty:
+        st.warning("No individual evaluation data available.")
+    else:
+        fig_quantitative, judge_figs = build_individual_figures(
+            selected_days, data_fingerprint(df_individual), df_individual
+        )
         
-        with col3:
-            # Scatter plot: Background Quality
-            fig8 = go.Figure()
-            
-            for feedback_type in df_individual['user_feedback'].unique():
-                subset = df_individual[df_individual['user_feedback'] == feedback_type]
-                fig8.add_trace(go.Scatter(
-                    x=subset['feedback_timestamp'],
-                    y=subset['background_quality_binary'],
-                    mode='markers',
-                    name=f'{feedback_type.capitalize()} Feedback',
-                    marker=dict(
-                        size=10,
-                        color=colors.get(feedback_type, '#95a5a6'),
-                        opacity=0.6
-                    ),
-                    text=subset['background_quality_score'],
-                    hovertemplate='<b>%{x}</b><br>Score: %{text}<br>Binary: %{y}<extra></extra>'
-                ))
-            
-            fig8.update_layout(
-                title="Background Info Quality",
-                xaxis_title="Feedback Timestamp",
-                yaxis_title="Binary Score (0=Bad, 1=Good)",
-                yaxis=dict(tickvals=[0, 1], ticktext=['Bad', 'Good']),
-                hovermode='closest',
-                height=300
-            )
-            st.plotly_chart(fig8, use_container_width=True)
+        st.markdown("### Quantitative Metrics Over Time")
+        st.plotly_chart(fig_quantitative, use_container_width=True)
+
+        st.write("---")
+        st.markdown("### LLM-as-Judge Metrics Over Time")
         
-        with col4:
-            # Scatter plot: Background Context Usage
-            fig9 = go.Figure()
-            
-            for feedback_type in df_individual['user_feedback'].unique():
-                subset = df_individual[df_individual['user_feedback'] == feedback_type]
-                fig9.add_trace(go.Scatter(
-                    x=subset['feedback_timestamp'],
-                    y=subset['background_context_binary'],
-                    mode='markers',
-                    name=f'{feedback_type.capitalize()} Feedback',
-                    marker=dict(
-                        size=10,
-                        color=colors.get(feedback_type, '#95a5a6'),
-                        opacity=0.6
-                    ),
-                    text=subset['background_context_score'],
-                    hovertemplate='<b>%{x}</b><br>Score: %{text}<br>Binary: %{y}<extra></extra>'
-                ))
-            
-            fig9.update_layout(
-                title="Background Context Usage",
-                xaxis_title="Feedback Timestamp",
-                yaxis_title="Binary Score (0=No, 1=Yes)",
-                yaxis=dict(tickvals=[0, 1], ticktext=['No', 'Yes']),
-                hovermode='closest',
-                height=300
-            )
-            st.plotly_chart(fig9, use_container_width=True)
+        # Grid of LLM judge metrics, two per row
+        for row_start in range(0, len(judge_figs), 2):
+            for col, fig in zip(st.columns(2), judge_figs[row_start:row_start + 2]):
+                with col:
+                    st.plotly_chart(fig, use_container_width=True)
 
 
 with tab3:
     st.markdown("**Distribution analysis from `evaluations` table**")
     
-    if df_individual.empty:
+    if df_individual is None:
+        st.info("Turn on **Load individual evaluations** in the sidebar to see this tab.")
+    elif df_individual.empty:
         st.warning("No individual evaluation data available.")
     else:
+        hist_figs, score_figs = build_distribution_figures(
+            selected_days, data_fingerprint(df_individual), df_individual
+        )
+        
         col1, col2 = st.columns(2)
         
         with col1:
-            # Histogram: Background Word Count
-            fig6 = go.Figure()
-            fig6.add_trace(go.Histogram(
-                x=df_individual['background_word_count'],
-                nbinsx=20,
-                marker_color='#3498db',
-                opacity=0.7,
-                name='Word Count'
-            ))
-            fig6.update_layout(
-                title="Distribution of Background Word Count",
-                xaxis_title="Word Count",
-                yaxis_title="Frequency",
-                height=300
-            )
-            st.plotly_chart(fig6, use_container_width=True)
+            st.plotly_chart(hist_figs[0], use_container_width=True)
         
         with col2:
-            # Histogram: Similarity
-            fig7 = go.Figure()
-            fig7.add_trace(go.Histogram(
-                x=df_individual['reason_background_similarity'],
-                nbinsx=20,
-                marker_color='#e74c3c',
-                opacity=0.7,
-                name='Similarity'
-            ))
-            fig7.update_layout(
-                title="Distribution of Similarity Scores",
-                xaxis_title="Similarity Score",
-                yaxis_title="Frequency",
-                height=300
-            )
-            st.plotly_chart(fig7, use_container_width=True)
+            st.plotly_chart(hist_figs[1], use_container_width=True)
         
         # Count plot: LLM Judge Scores
         st.subheader("LLM-as-Judge Score Distributions")
         
-        score_cols = [
-            ('grading_context_score', 'Context Usage'),
-            ('grading_accuracy_score', 'Grading Accuracy'),
-            ('background_quality_score', 'Background Quality'),
-            ('background_context_score', 'Background Context')
-        ]
-        
         col1, col2 = st.columns(2)
         
-        for idx, (col_name, title) in enumerate(score_cols):
+        for idx, fig in enumerate(score_figs):
             with col1 if idx % 2 == 0 else col2:
-                if col_name in df_individual.columns:
-                    counts = df_individual[col_name].value_counts().sort_index()
-                    
-                    fig = go.Figure(data=[
-                        go.Bar(
-                            x=counts.index,
-                            y=counts.values,
-                            marker_color='#9b59b6',
-                            opacity=0.7
-                        )
-                    ])
-                    fig.update_layout(
-                        title=title,
-                        xaxis_title="Score",
-                        yaxis_title="Count",
-                        height=250
-                    )
-                    st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(fig, use_container_width=True)
 
 st.write("---")
 # ============================================================================
@@ -646,44 +699,34 @@ st.write("---")
 
 st.subheader("📋 Daily Breakdown")
 
-# Prepare display dataframe
-display_df = df.copy()
-display_df['date'] = display_df['date'].astype(str)
-display_df['positive_feedback_rate'] = (display_df['positive_feedback_rate'] * 100).round(1).astype(str) + '%'
-display_df['mean_background_word_count'] = display_df['mean_background_word_count'].round(1)
-display_df['mean_similarity'] = display_df['mean_similarity'].round(2)
-display_df['grading_context_pass_rate'] = (display_df['grading_context_pass_rate'] * 100).round(1).astype(str) + '%'
-display_df['grading_accuracy_pass_rate'] = (display_df['grading_accuracy_pass_rate'] * 100).round(1).astype(str) + '%'
-display_df['background_quality_pass_rate'] = (display_df['background_quality_pass_rate'] * 100).round(1).astype(str) + '%'
-display_df['background_context_pass_rate'] = (display_df['background_context_pass_rate'] * 100).round(1).astype(str) + '%'
-
-# Rename columns for display
-display_df.columns = [
-    'Date',
-    'Feedback Count',
-    'Positive Rate',
-    'Avg Words',
-    'Similarity',
-    'GR Context',
-    'GR Accuracy',
-    'BG Quality',
-    'BG Context'
-]
-
-# Show last 10 days by default
+# Display names and number formats for the table (values stay numeric; the dataframe component formats them in the browser)
+DAILY_TABLE_CONFIG = {
+    'date': st.column_config.DateColumn('Date'),
+    'feedback_count': st.column_config.NumberColumn('Feedback Count'),
+    'positive_feedback_rate': st.column_config.NumberColumn('Positive Rate', format='percent'),
+    'mean_background_word_count': st.column_config.NumberColumn('Avg Words', format='%.1f'),
+    'mean_similarity': st.column_config.NumberColumn('Similarity', format='%.2f'),
+    'grading_context_pass_rate': st.column_config.NumberColumn('GR Context', format='percent'),
+    'grading_accuracy_pass_rate': st.column_config.NumberColumn('GR Accuracy', format='percent'),
+    'background_quality_pass_rate': st.column_config.NumberColumn('BG Quality', format='percent'),
+    'background_context_pass_rate': st.column_config.NumberColumn('BG Context', format='percent')
+}
+
+# Show last 10 days by default, newest first (df is already ordered by date, so no sort is needed)
 st.dataframe(
-    display_df.tail(10).sort_values('Date', ascending=False),
+    df.tail(10).iloc[::-1],
+    column_config=DAILY_TABLE_CONFIG,
     use_container_width=True,
     hide_index=True
 )
 
 # Download button
-csv = df.to_csv(index=False)
 st.download_button(
     label="📥 Download Full Data (CSV)",
-    data=csv,
-    file_name=f"evaluation_metrics_{datetime.now().strftime('%Y%m%d')}.csv",
-    mime="text/csv"
+    data=metrics_csv_bytes(selected_days, data_fingerprint(df), df),
+    file_name=f"evaluation_metrics_{now.strftime('%Y%m%d')}.csv",
+    mime="text/csv",
+    on_click="ignore"  # Downloading doesn't change anything on the page, so don't rerun it
 )
 
 # ============================================================================
@@ -692,4 +735,4 @@ st.download_button(
 
 st.write("---")
 st.caption("🔄 Dashboard updates daily with new evaluation results | Last updated: " + 
-           datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
\ No newline at end of file
+           now.strftime("%Y-%m-%d %H:%M:%S"))
\ No newline at end of file
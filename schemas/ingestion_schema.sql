@@ -33,4 +33,8 @@ CREATE TABLE IF NOT EXISTS feedback (
     model VARCHAR(50),
     llm_temperature FLOAT,
     context TEXT
-);
\ No newline at end of file
+);
+
+-- Index for the evaluation pipeline's date range filter on feedback (a plain btree on
+-- timestamp, so it also serves the ORDER BY timestamp)
+CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp);
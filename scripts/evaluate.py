@@ -27,6 +27,12 @@ Usage:
     
     # Custom model settings
     python scripts/evaluate.py --date 2025-10-16 --model gpt-4o-mini --temperature 0.5
+    
+    # Judge through the OpenAI Batch API (cheaper, not interactive)
+    python scripts/evaluate.py --batch-mode
+    
+    # Redo feedback that was already evaluated
+    python scripts/evaluate.py --date 2025-10-16 --reevaluate
 """
 import os
 import sys
@@ -41,14 +47,21 @@ from utils.evaluation import (
     add_background_word_count, 
     add_reason_background_similarity, 
     run_llm_evaluation,
+    run_llm_evaluation_batch,
     get_date_filter,
     load_feedback_data,
-    save_evaluation_results
+    save_evaluation_results,
+    LLM_JUDGE_CONCURRENCY,
+    LLM_JUDGE_RPM,
+    LLM_JUDGE_TPM,
+    LLM_JUDGE_ROWS_PER_CALL,
+    LLM_JUDGE_CACHE_PATH
 )
 
 #add the rest of the libraries 
 import argparse
 import psycopg2
+from contextlib import closing
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -95,10 +108,49 @@ def parse_args():
     )
     
     parser.add_argument(
-        '--delay',
-        type=float,
-        default=1.0,
-        help='Delay between LLM API calls in seconds (default: 1.0)'
+        '--concurrency',
+        type=int,
+        default=LLM_JUDGE_CONCURRENCY,
+        help=f'Maximum concurrent LLM API calls (default: {LLM_JUDGE_CONCURRENCY})'
+    )
+    
+    parser.add_argument(
+        '--rpm',
+        type=int,
+        default=LLM_JUDGE_RPM,
+        help=f'OpenAI requests per minute budget for the LLM judge (default: {LLM_JUDGE_RPM})'
+    )
+    
+    parser.add_argument(
+        '--tpm',
+        type=int,
+        default=LLM_JUDGE_TPM,
+        help=f'OpenAI tokens per minute budget for the LLM judge (default: {LLM_JUDGE_TPM})'
+    )
+    
+    parser.add_argument(
+        '--rows-per-call',
+        type=int,
+        default=LLM_JUDGE_ROWS_PER_CALL,
+        help=f'Feedback rows judged per LLM API request (default: {LLM_JUDGE_ROWS_PER_CALL})'
+    )
+    
+    parser.add_argument(
+        '--batch-mode',
+        action='store_true',
+        help='Submit the LLM judge requests through the OpenAI Batch API (half price, may take up to 24h)'
+    )
+    
+    parser.add_argument(
+        '--reevaluate',
+        action='store_true',
+        help='Also re-evaluate feedback that already has results in the evaluations table'
+    )
+    
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Call the LLM judge for every row instead of reusing cached responses'
     )
     
     return parser.parse_args()
@@ -111,7 +163,7 @@ def main():
     start_date, end_date = get_date_filter(args)
     
     print(f"📅 Evaluating feedback from {start_date} to {end_date}")
-    print(f"🤖 Using model: {args.model} (temp={args.temperature}, delay={args.delay}s)")
+    print(f"🤖 Using model: {args.model} (temp={args.temperature}, concurrency={args.concurrency})")
     print("-" * 60)
     
     # Get the database URL
@@ -120,19 +172,21 @@ def main():
     if not DATABASE_URL:
         raise ValueError("❌ DATABASE_URL not found in environment variables")
     
-    # Connect to Neon
-    conn = psycopg2.connect(DATABASE_URL)
-    print("✅ Connected to Neon!")
-    
-    # Load feedback data for specified date range
-    df = load_feedback_data(conn, start_date, end_date)
+    # Connect to Neon just for the load; the LLM phase can outlast Neon's idle suspend,
+    # so results are saved over a fresh connection afterwards
+    with closing(psycopg2.connect(DATABASE_URL)) as conn:
+        print("✅ Connected to Neon!")
+        
+        # Load feedback data for specified date range
+        df = load_feedback_data(conn, start_date, end_date, skip_already_evaluated=not args.reevaluate)
     
-    conn.close()
     print(f"📊 Total feedback entries: {len(df)}")
     
     if len(df) == 0:
-        print("⚠️  No feedback data found for the specified date range")
-        conn.close()
+        if args.reevaluate:
+            print("⚠️  No feedback data found for the specified date range")
+        else:
+            print("⚠️  No new feedback to evaluate in the specified date range (use --reevaluate to redo it)")
         return
     
     # Show breakdown by feedback type
@@ -159,16 +213,22 @@ def main():
 
     # 4. Run LLM-as-Judge for all qualitative metrics
     print("4️⃣ Running LLM-as-Judge evaluations...")
-    df = run_llm_evaluation(df, args.model, args.temperature, args.delay)
+    cache_path = None if args.no_cache else LLM_JUDGE_CACHE_PATH
+    if args.batch_mode:
+        df = run_llm_evaluation_batch(df, args.model, args.temperature, cache_path=cache_path)
+    else:
+        df = run_llm_evaluation(
+            df, args.model, args.temperature, args.concurrency, args.rpm, args.tpm,
+            cache_path=cache_path,
+            rows_per_call=args.rows_per_call
+        )
 
     print("\n✅ Evaluation calculations complete!")
     
-    # Save results back to database
-    conn = psycopg2.connect(DATABASE_URL)
-    save_evaluation_results(df, conn)
+    # Save results back to database (connection closed even if the save fails)
+    with closing(psycopg2.connect(DATABASE_URL)) as conn:
+        save_evaluation_results(df, conn)
 
-    # Close connection
-    conn.close()
     print("\n✅ Database connection closed")
     print("🎉 Pipeline complete!")
 
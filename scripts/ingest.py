@@ -12,6 +12,7 @@ Usage:
 
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Get project paths
@@ -38,6 +39,9 @@ from utils.qdrant import create_qdrant_collection, create_embedded_points
 COLLECTION_NAME = 'usa_civics_guide'
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIMENSION = 1536  # Matches text-embedding-3-small
+UPLOAD_BATCH_SIZE = 64
+UPLOAD_PARALLEL = 2
+UPLOAD_MAX_RETRIES = 3
 
 
 def main():
@@ -74,14 +78,6 @@ def main():
         download_info = download_civics_documents(save_dir=str(DOCUMENTS_DIR))
         print(f"✓ Downloaded {len(download_info['tests'])} tests and 1 guide")
         
-        # Step 2: Extract Q&As, fill missing data, and save as JSON
-        print("\n[Step 2/4] Processing civics test Q&A pairs...")
-        all_qa_pairs = process_civics_tests(download_info, (DOCUMENTS_DIR))
-        total_questions = sum(len(qa) for qa in all_qa_pairs.values())
-        print(f"✓ Processed {total_questions} total questions")
-        
-        # Step 3: Extract the civics guide information
-        print("\n[Step 3/4] Extracting text from civics guide...")
         guide_document = os.path.join(
             DOCUMENTS_DIR,
             f"{download_info['guide']['test_type']}.pdf"
@@ -91,7 +87,19 @@ def main():
             print(f"✗ Error: Guide PDF not found at {guide_document}")
             sys.exit(1)
         
-        datapoints = extract_clean_text_from_guide(guide_document)
+        # Steps 2 and 3 are independent, so run them side by side
+        # (the Q&A step mostly waits on officeholder lookups and LLM calls)
+        print("\n[Step 2/4] Processing civics test Q&A pairs...")
+        print("[Step 3/4] Extracting text from civics guide...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            qa_future = executor.submit(process_civics_tests, download_info, DOCUMENTS_DIR)
+            guide_future = executor.submit(extract_clean_text_from_guide, guide_document)
+            all_qa_pairs = qa_future.result()
+            datapoints = guide_future.result()
+        
+        # Summaries of steps 2 and 3, printed once both have finished
+        total_questions = sum(len(qa) for qa in all_qa_pairs.values())
+        print(f"\n✓ Processed {total_questions} total questions")
         print(f"✓ Extracted {len(datapoints)} text segments from guide")
         
         # Step 4: Upload the civics guide pages to Qdrant
@@ -115,9 +123,13 @@ def main():
         
         # Upload to Qdrant
         print(f"  Uploading {len(points)} points to Qdrant...")
-        qdrant_client.upsert(
+        qdrant_client.upload_points(
             collection_name=COLLECTION_NAME,
-            points=points
+            points=points,
+            batch_size=UPLOAD_BATCH_SIZE,
+            parallel=UPLOAD_PARALLEL,
+            max_retries=UPLOAD_MAX_RETRIES,
+            wait=True
         )
         print(f"✓ Successfully uploaded {len(points)} embedded documents")
         
@@ -1,4 +1,4 @@
-from .rag import get_context, llm, rag
+from .rag import get_context, llm, llm_async, llm_stream, rag, rag_stream
 from .io import (
     save_to_json,
     load_from_json,
@@ -31,6 +31,8 @@ from .evaluation import(
     add_background_word_count,
     add_reason_background_similarity,
     run_llm_evaluation,
+    run_llm_evaluation_batch,
+    binarize_scores,
     convert_to_binary,
     get_date_filter,
     load_feedback_data,
@@ -40,7 +42,10 @@ from .evaluation import(
 __all__ = [
     'get_context',
     'llm',
+    'llm_async',
+    'llm_stream',
     'rag',
+    'rag_stream',
     'save_to_json',
     'load_from_json',
     'save_to_txt',
@@ -62,6 +67,8 @@ __all__ = [
     'add_background_word_count',
     'add_reason_background_similarity',
     'run_llm_evaluation',
+    'run_llm_evaluation_batch',
+    'binarize_scores',
     'convert_to_binary',
     'get_date_filter',
     'load_feedback_data',
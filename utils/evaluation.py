@@ -1,12 +1,144 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-from utils.prompts import LLM_JUDGE_SYSTEM_PROMPT, LLM_JUDGE_USER_PROMPT
-from utils.rag import llm
-from tqdm import tqdm
+from sklearn.feature_extraction.text import HashingVectorizer
+from utils.prompts import (
+    LLM_JUDGE_SYSTEM_PROMPT, LLM_JUDGE_USER_PROMPT, LLM_JUDGE_BATCH_SYSTEM_PROMPT, LLM_JUDGE_BATCH_ITEM_PROMPT, render_prompt
+)
+from utils.rag import llm_async, parse_llm_output
+from openai import OpenAI, AsyncOpenAI, RateLimitError
+from tqdm.asyncio import tqdm_asyncio
+import asyncio
+import hashlib
+import os
+import sqlite3
 import time
+import orjson
 import numpy as np
 from datetime import datetime, timedelta
 import pandas as pd
+from psycopg2.extras import execute_values
+
+# Rows per multi-VALUES statement when bulk inserting results
+INSERT_PAGE_SIZE = 500
+
+# LLM judge requests in flight at once
+LLM_JUDGE_CONCURRENCY = 8
+
+# Retries (exponential backoff, honoring Retry-After) the OpenAI client makes on 429/5xx responses
+LLM_JUDGE_MAX_RETRIES = 5
+
+# Feedback rows packed into one judge request by default (1 = one request per row)
+LLM_JUDGE_ROWS_PER_CALL = 1
+
+# OpenAI Batch API: completion window and how often to check on a submitted batch
+LLM_JUDGE_BATCH_WINDOW = '24h'
+LLM_JUDGE_BATCH_POLL_SECONDS = 60
+
+# Extra attempts per row when requests are still rate limited after those retries; each one
+# halves the shared rate budget and backs off exponentially (1s, 2s, ...)
+LLM_JUDGE_RATE_LIMIT_ATTEMPTS = 3
+
+# Seconds after a throttle during which further rate limit errors don't lower the budget again
+# (one burst of 429s hits every in-flight task), and the fraction of the configured budget
+# restored after each successful request once that window has passed
+LLM_JUDGE_THROTTLE_COOLDOWN = 60
+LLM_JUDGE_RECOVERY_STEP = 0.05
+
+# LLM judge user prompt fields and the feedback columns that fill them
+LLM_JUDGE_PROMPT_FIELDS = {
+    'question': 'question_text',
+    'answers': 'correct_answers',
+    'user_state': 'user_state',
+    'user_answer': 'user_answer',
+    'success': 'success',
+    'reason': 'reason',
+    'background_info': 'background_info',
+    'context': 'context',
+}
+
+# Prompt fields that must be non-empty for a row to be worth judging
+LLM_JUDGE_REQUIRED_FIELDS = ('reason', 'background_info')
+
+# Longest judge user prompt sent (estimated tokens); longer prompts get their context truncated
+LLM_JUDGE_MAX_PROMPT_TOKENS = 7000
+
+# LLM judge response keys and the result columns they are stored in
+LLM_JUDGE_COLUMNS = {
+    'answer_context_usage': 'llm_judge_grading_context_usage',
+    'answer_context_usage_reason': 'llm_judge_grading_context_usage_reason',
+    'answer_context_usage_confidence': 'llm_judge_grading_context_usage_confidence',
+    'grading_accuracy': 'llm_judge_grading_accuracy',
+    'grading_accuracy_reason': 'llm_judge_grading_accuracy_reason',
+    'grading_accuracy_confidence': 'llm_judge_grading_accuracy_confidence',
+    'background_info_quality': 'llm_judge_background_info_quality',
+    'background_info_quality_reason': 'llm_judge_background_info_quality_reason',
+    'background_info_quality_confidence': 'llm_judge_background_info_quality_confidence',
+    'background_context_usage': 'llm_judge_background_context_usage',
+    'background_context_usage_reason': 'llm_judge_background_context_usage_reason',
+    'background_context_usage_confidence': 'llm_judge_background_context_usage_confidence',
+}
+
+# Default OpenAI rate budget for the judge (requests / tokens per minute)
+LLM_JUDGE_RPM = 500
+LLM_JUDGE_TPM = 90_000
+
+# Rough token estimate for rate limiting: prompt characters per token, plus the judge's JSON reply
+CHARS_PER_TOKEN = 4
+LLM_JUDGE_OUTPUT_TOKENS = 400
+
+# On-disk cache of LLM judge responses (relative to the project root)
+LLM_JUDGE_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'llm_judge.sqlite')
+
+# Smoothed idf TfidfVectorizer gives a term found in only one of two documents:
+# ln((1 + 2) / (1 + 1)) + 1 (a term in both gets ln(3 / 3) + 1 = 1)
+PAIR_UNIQUE_TERM_IDF = np.log(1.5) + 1
+
+# Hash buckets for the similarity term counts (tokens from two short texts rarely collide)
+SIMILARITY_HASH_FEATURES = 2 ** 20
+
+# Feedback columns the evaluation pipeline actually reads (avoids pulling
+# the large prompt/debug columns over the wire)
+FEEDBACK_COLUMNS = [
+    'id',
+    'timestamp',
+    'user_state',
+    'question_text',
+    'correct_answers',
+    'user_answer',
+    'success',
+    'reason',
+    'background_info',
+    'feedback_type',
+    'context',
+]
+
+# Feedback rows fetched per round trip by the server-side cursor
+FEEDBACK_FETCH_CHUNK_SIZE = 5000
+
+# Feedback columns that only ever hold a handful of distinct labels
+FEEDBACK_CATEGORICAL_COLUMNS = ['user_state', 'feedback_type']
+
+# Result columns in the order of the evaluations INSERT (minus evaluation_version)
+EVALUATION_SOURCE_COLUMNS = [
+    'id',  # feedback_id from original feedback table
+    'eval_date',
+    'question_text',
+    'correct_answers',
+    'user_answer',
+    'user_state',
+    'success',
+    'reason',
+    'feedback_type',
+    'background_info_word_count',
+    'reason_bkg_info_similarity',
+    'llm_judge_grading_context_usage',
+    'llm_judge_grading_context_usage_reason',
+    'llm_judge_grading_accuracy',
+    'llm_judge_grading_accuracy_reason',
+    'llm_judge_background_info_quality',
+    'llm_judge_background_info_quality_reason',
+    'llm_judge_background_context_usage',
+    'llm_judge_background_context_usage_reason',
+    'timestamp',
+]
 
 def get_positive_feedback_rate(df):
     """
@@ -36,7 +168,11 @@ def add_background_word_count(df):
     Returns:
         DataFrame: Original DataFrame with new 'background_info_word_count' column added
     """
-    df['background_info_word_count'] = df['background_info'].str.split().str.len()
+    # Plain str.split() per text beats building a Series of token lists with .str.split()
+    counts = [len(text.split()) if isinstance(text, str) else np.nan for text in df['background_info']]
+    
+    # Smallest integer dtype that fits (stays float if any background is missing)
+    df['background_info_word_count'] = pd.to_numeric(counts, downcast='integer')
     return df
 
 
@@ -45,42 +181,118 @@ def add_reason_background_similarity(df):
     Calculate cosine similarity between reason and background_info using TF-IDF.
     Adds 'reason_bkg_info_similarity' column to DataFrame.
     
+    Each pair is scored as if a TfidfVectorizer were fit on just that pair, but all
+    rows are tokenized in one pass and scored with sparse matrix operations.
+    
     Args:
         df: DataFrame with 'reason' and 'background_info' columns
     
     Returns:
         DataFrame: Original DataFrame with new 'reason_bkg_info_similarity' column added
     """
-    similarities = []
+    n = len(df)
+    if n == 0:
+        df['reason_bkg_info_similarity'] = pd.Series(dtype=np.float32)
+        return df
     
-    for idx, row in df.iterrows():
-        reason = str(row['reason'])
-        background = str(row['background_info'])
-        
-        # Create TF-IDF vectors
-        vectorizer = TfidfVectorizer()
-        try:
-            tfidf_matrix = vectorizer.fit_transform([reason, background])
-            similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-        except:
-            similarity = 0.0  # Handle edge cases
-        
-        similarities.append(similarity)
+    # Term counts for every reason (first n rows) and background (last n rows); hashing
+    # tokens needs no vocabulary fit, and collisions are negligible at SIMILARITY_HASH_FEATURES
+    counts = HashingVectorizer(
+        n_features=SIMILARITY_HASH_FEATURES, alternate_sign=False, norm=None
+    ).transform(
+        pd.concat([df['reason'].map(str), df['background_info'].map(str)])
+    )
+    
+    reason, background = counts[:n], counts[n:]
+    
+    # Within a pair, terms found in both texts get idf 1 and the rest PAIR_UNIQUE_TERM_IDF,
+    # so only the squared norms need reweighting (the dot product only sees shared terms)
+    shared = (reason > 0).multiply(background > 0)
+    
+    def pair_norm(matrix):
+        squared = matrix.multiply(matrix)
+        shared_sq = _row_sums(squared.multiply(shared))
+        unique_sq = _row_sums(squared) - shared_sq
+        return np.sqrt(shared_sq + PAIR_UNIQUE_TERM_IDF ** 2 * unique_sq)
     
-    df['reason_bkg_info_similarity'] = similarities
+    dot = _row_sums(reason.multiply(background))
+    norms = pair_norm(reason) * pair_norm(background)
+    
+    # Pairs where either text has no tokens get 0.0
+    df['reason_bkg_info_similarity'] = np.divide(dot, norms, out=np.zeros(n), where=norms > 0).astype(np.float32)
     return df
 
 
-def run_llm_evaluation(df, model='gpt-4o-mini', temperature=0.5, delay=0.5):
+def _row_sums(matrix):
+    """Row sums of a sparse matrix as a flat array"""
+    return np.asarray(matrix.sum(axis=1)).ravel()
+
+
+def run_llm_evaluation(df, model='gpt-4o-mini', temperature=0.5, max_concurrency=LLM_JUDGE_CONCURRENCY,
+                       rpm=LLM_JUDGE_RPM, tpm=LLM_JUDGE_TPM, cache_path=LLM_JUDGE_CACHE_PATH,
+                       rows_per_call=LLM_JUDGE_ROWS_PER_CALL):
     """ 
     Run llm-as-judge given a model and a temperature. Returns an updated df.
     Note: internally we are populating via user prompt all the background information of that qna
     
+    Up to max_concurrency judge requests are in flight at once, started no faster than the
+    rpm/tpm budget allows; rate-limited (429) and server errors are still retried by the
+    OpenAI client with exponential backoff. If a request is still rate limited after that,
+    the budget is halved for all remaining requests and the row is tried again.
+    
+    Successful evaluations are cached on disk by (model, temperature, prompts), so re-running
+    over an overlapping date range only pays for rows that were not judged before.
+    
+    With rows_per_call > 1, that many rows are judged in a single request that returns a list
+    of evaluations; if the reply does not line up with the rows, they are judged one by one.
+    
+    Args:
+        df: DataFrame with feedback data
+        model: OpenAI model to use (default: gpt-4o-mini)
+        temperature: Temperature for LLM (default: 0.5)
+        max_concurrency: Maximum number of concurrent API calls (default: LLM_JUDGE_CONCURRENCY)
+        rpm: Requests per minute budget (default: LLM_JUDGE_RPM)
+        tpm: Tokens per minute budget, prompt plus expected output (default: LLM_JUDGE_TPM)
+        cache_path: SQLite file for the judge response cache, or None to disable it (default: LLM_JUDGE_CACHE_PATH)
+        rows_per_call: Rows judged per API request (default: LLM_JUDGE_ROWS_PER_CALL)
+    
+    Returns:
+        DataFrame: Copy of original DataFrame with LLM judge columns added
+    """
+    # Work on a copy to avoid modifying original
+    df = df.copy()
+    
+    # One (evaluation, error message or None, served from cache) triple per row, in row order
+    cache = _JudgeCache(cache_path) if cache_path else None
+    try:
+        results = asyncio.run(_judge_rows(
+            df, model, temperature, max_concurrency, _RateLimiter(rpm, tpm), cache, rows_per_call
+        ))
+    finally:
+        if cache:
+            cache.close()
+    
+    settings = [f"Concurrency: {max_concurrency} requests"]
+    if rows_per_call > 1:
+        settings.append(f"Rows per request: {rows_per_call}")
+    return _add_judge_columns(df, results, model, temperature, settings, cache is not None)
+
+
+def run_llm_evaluation_batch(df, model='gpt-4o-mini', temperature=0.5, cache_path=LLM_JUDGE_CACHE_PATH,
+                             poll_seconds=LLM_JUDGE_BATCH_POLL_SECONDS):
+    """
+    Run llm-as-judge through the OpenAI Batch API. Returns an updated df, like run_llm_evaluation.
+    
+    Meant for the offline daily run: every uncached row is submitted as one batch job (half
+    the price of regular requests and no rate limiting on our side), which is then polled
+    until it finishes. Can take up to LLM_JUDGE_BATCH_WINDOW to complete.
+    
     Args:
         df: DataFrame with feedback data
         model: OpenAI model to use (default: gpt-4o-mini)
         temperature: Temperature for LLM (default: 0.5)
-        delay: Seconds to wait between API calls to avoid rate limits (default: 0.5)
+        cache_path: SQLite file for the judge response cache, or None to disable it (default: LLM_JUDGE_CACHE_PATH)
+        poll_seconds: Seconds between batch status checks (default: LLM_JUDGE_BATCH_POLL_SECONDS)
     
     Returns:
         DataFrame: Copy of original DataFrame with LLM judge columns added
@@ -88,86 +300,136 @@ def run_llm_evaluation(df, model='gpt-4o-mini', temperature=0.5, delay=0.5):
     # Work on a copy to avoid modifying original
     df = df.copy()
     
-    evaluations = []
-    errors = []
+    cache = _JudgeCache(cache_path) if cache_path else None
+    try:
+        results, pending = _prepare_judge_rows(df, model, temperature, cache)
+        if pending:
+            _judge_rows_batch(pending, results, model, temperature, cache, poll_seconds)
+    finally:
+        if cache:
+            cache.close()
+    
+    return _add_judge_columns(df, results, model, temperature, ["Batch API"], cache is not None)
 
-    # Loop through each row with progress bar
-    for idx, row in tqdm(df.iterrows(), total=len(df), desc=f"Running {model} evaluations"):
-        
-        try:
-            # Format the user prompt with row data
-            llm_judge_user_prompt_formatted = LLM_JUDGE_USER_PROMPT.format(
-                question=row['question_text'],
-                answers=row['correct_answers'],
-                user_state=row['user_state'],
-                user_answer=row['user_answer'],
-                success=row['success'],
-                reason=row['reason'],
-                background_info=row['background_info'],
-                context=row['context'],
-            )
+
+def _judge_rows_batch(pending, results, model, temperature, cache, poll_seconds):
+    """Submit the pending judge requests as one Batch API job, wait for it, and store each row's result"""
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=LLM_JUDGE_MAX_RETRIES)
+    
+    # One chat completion request per row; custom_id maps the answer back to the row position
+    requests_jsonl = b"\n".join(
+        orjson.dumps({
+            "custom_id": str(position),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": {
+                "model": model,
+                "messages": [
+                    {"role": "system", "content": LLM_JUDGE_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt},
+                ],
+                "response_format": {"type": "json_object"},
+                "temperature": temperature,
+            },
+        })
+        for position, _, user_prompt, _ in pending
+    )
+    
+    input_file = client.files.create(file=("llm_judge_requests.jsonl", requests_jsonl), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window=LLM_JUDGE_BATCH_WINDOW
+    )
+    print(f"📤 Submitted batch {batch.id} with {len(pending)} requests")
+    
+    while batch.status not in ('completed', 'failed', 'expired', 'cancelled'):
+        time.sleep(poll_seconds)
+        batch = client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        if counts:
+            print(f"   {batch.status}: {counts.completed}/{counts.total} done, {counts.failed} failed")
+    print(f"📥 Batch {batch.id} {batch.status}")
+    
+    # Successful answers land in the output file, per-request failures in the error file
+    # (an expired batch still returns whatever finished)
+    by_position = {position: (idx, cache_key) for position, idx, _, cache_key in pending}
+    for file_id in (batch.output_file_id, batch.error_file_id):
+        if not file_id:
+            continue
+        for line in client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = orjson.loads(line)
+            position = int(record['custom_id'])
+            idx, cache_key = by_position[position]
             
-            # Call the LLM
-            evaluation = llm(
-                system_prompt=LLM_JUDGE_SYSTEM_PROMPT,
-                user_prompt=llm_judge_user_prompt_formatted,
-                model=model,
-                temperature=temperature
-            )
+            response = record.get('response') or {}
+            if record.get('error') or response.get('status_code') != 200:
+                error = str(record.get('error') or response.get('body', {}).get('error', 'Unknown error'))
+                print(f"\n❌ Row {idx}: Batch request failed - {error}")
+                results[position] = ({}, error, False)
+                continue
+            
+            evaluation = parse_llm_output(response['body']['choices'][0]['message']['content'])
             
             # Check if LLM returned an error
             if 'error' in evaluation:
-                print(f"\n⚠️  Row {idx}: LLM returned error - {evaluation.get('error', 'Unknown error')}")
-                errors.append({'idx': idx, 'error': evaluation.get('error', 'Unknown error')})
-            
-            evaluations.append(evaluation)
-            
-            # Add delay to avoid rate limits
-            time.sleep(delay)
+                error = evaluation.get('error', 'Unknown error')
+                print(f"\n⚠️  Row {idx}: LLM returned error - {error}")
+                results[position] = (evaluation, error, False)
+                continue
             
-        except KeyError as e:
-            # Handle missing keys in format string
-            print(f"\n❌ Row {idx}: Missing required field - {e}")
-            errors.append({'idx': idx, 'error': f'Missing field: {e}'})
-            evaluations.append({})
-            
-        except Exception as e:
-            # Catch all other exceptions
-            print(f"\n❌ Row {idx}: Unexpected error - {e}")
-            errors.append({'idx': idx, 'error': str(e)})
-            evaluations.append({})
-
-    # Parse evaluations and add as columns (raw values, no conversion)
-    df['llm_judge_grading_context_usage'] = [e.get('answer_context_usage', None) for e in evaluations]
-    df['llm_judge_grading_context_usage_reason'] = [e.get('answer_context_usage_reason', '') for e in evaluations]
-    df['llm_judge_grading_context_usage_confidence'] = [e.get('answer_context_usage_confidence', None) for e in evaluations]
+            if cache:
+                cache.set(cache_key, evaluation)
+            results[position] = (evaluation, None, False)
+    
+    # Rows the batch never got to
+    for position, idx, _, _ in pending:
+        if results[position] is None:
+            results[position] = ({}, f"No batch result (batch {batch.status})", False)
 
-    df['llm_judge_grading_accuracy'] = [e.get('grading_accuracy', None) for e in evaluations]
-    df['llm_judge_grading_accuracy_reason'] = [e.get('grading_accuracy_reason', '') for e in evaluations]
-    df['llm_judge_grading_accuracy_confidence'] = [e.get('grading_accuracy_confidence', None) for e in evaluations]
 
-    df['llm_judge_background_info_quality'] = [e.get('background_info_quality', None) for e in evaluations]
-    df['llm_judge_background_info_quality_reason'] = [e.get('background_info_quality_reason', '') for e in evaluations]
-    df['llm_judge_background_info_quality_confidence'] = [e.get('background_info_quality_confidence', None) for e in evaluations]
+def _add_judge_columns(df, results, model, temperature, settings, cache_enabled):
+    """Add the judge columns for per-row (evaluation, error, from cache) results to df and print a summary"""
+    evaluations = [evaluation for evaluation, _, _ in results]
+    errors = [
+        {'idx': idx, 'error': error}
+        for idx, (_, error, _) in zip(df.index, results)
+        if error is not None
+    ]
+    cache_hits = sum(cached for _, _, cached in results)
 
-    df['llm_judge_background_context_usage'] = [e.get('background_context_usage', None) for e in evaluations]
-    df['llm_judge_background_context_usage_reason'] = [e.get('background_context_usage_reason', '') for e in evaluations]
-    df['llm_judge_background_context_usage_confidence'] = [e.get('background_context_usage_confidence', None) for e in evaluations]
+    # Parse evaluations into one object array per judge column (raw values, no conversion)
+    judge_columns = {}
+    for key, column in LLM_JUDGE_COLUMNS.items():
+        # Missing reasons become '' and any other missing field None (NULL when saved)
+        default = '' if column.endswith('_reason') else None
+        values = np.empty(len(evaluations), dtype=object)
+        for i, evaluation in enumerate(evaluations):
+            value = evaluation.get(key)
+            values[i] = default if value is None else value
+        judge_columns[column] = values
+    judge_df = pd.DataFrame(judge_columns, index=df.index, dtype=object)
+    df = pd.concat([df, judge_df], axis=1)
     
     # Store raw evaluations for reference
     df['llm_judge_raw'] = evaluations
     
     # convert scores to binary
-    df['grading_context_binary'] = df['llm_judge_grading_context_usage'].apply(convert_to_binary)
-    df['grading_accuracy_binary'] = df['llm_judge_grading_accuracy'].apply(convert_to_binary)
-    df['background_quality_binary'] = df['llm_judge_background_info_quality'].apply(convert_to_binary)
-    df['background_context_binary'] = df['llm_judge_background_context_usage'].apply(convert_to_binary)
+    df['grading_context_binary'] = binarize_scores(df['llm_judge_grading_context_usage'])
+    df['grading_accuracy_binary'] = binarize_scores(df['llm_judge_grading_accuracy'])
+    df['background_quality_binary'] = binarize_scores(df['llm_judge_background_info_quality'])
+    df['background_context_binary'] = binarize_scores(df['llm_judge_background_context_usage'])
 
     # Print summary
     print(f"\n{'='*50}")
     print(f"✅ Completed {len(evaluations)} evaluations with {model}")
     print(f"   Temperature: {temperature}")
-    print(f"   Delay: {delay}s per request")
+    for setting in settings:
+        print(f"   {setting}")
+    if cache_enabled:
+        print(f"   Cache hits: {cache_hits}/{len(evaluations)} ({cache_hits / max(len(evaluations), 1):.0%})")
     
     if errors:
         print(f"\n⚠️  Encountered {len(errors)} errors:")
@@ -182,9 +444,271 @@ def run_llm_evaluation(df, model='gpt-4o-mini', temperature=0.5, delay=0.5):
     
     return df
 
+class _RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, shared by concurrent asyncio tasks.
+    
+    Both buckets start full and refill continuously; acquire() waits (first come, first
+    served) until both hold enough capacity for the next request, then spends it.
+    throttle() halves both rates when the API pushes back despite the budget (at most once
+    per cooldown window), and recover() raises them back towards the configured budget.
+    """
+    
+    def __init__(self, rpm, tpm):
+        self.max_rpm = rpm
+        self.max_tpm = tpm
+        self.rpm = rpm
+        self.tpm = tpm
+        self.last_throttle = None
+        self.available_requests = rpm
+        self.available_tokens = tpm
+        self.last_refill = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.last_refill
+        self.last_refill = now
+        self.available_requests = min(self.rpm, self.available_requests + elapsed * self.rpm / 60)
+        self.available_tokens = min(self.tpm, self.available_tokens + elapsed * self.tpm / 60)
+    
+    async def acquire(self, tokens):
+        async with self.lock:
+            while True:
+                self._refill()
+                # A request larger than the whole budget only has to wait for a full bucket;
+                # re-capped on every pass since throttle() may have shrunk the bucket meanwhile
+                needed = min(tokens, self.tpm)
+                if self.available_requests >= 1 and self.available_tokens >= needed:
+                    self.available_requests -= 1
+                    self.available_tokens -= needed
+                    return
+                
+                # Sleep until the scarcer bucket has refilled enough
+                await asyncio.sleep(max(
+                    (1 - self.available_requests) * 60 / self.rpm,
+                    (needed - self.available_tokens) * 60 / self.tpm
+                ))
+    
+    def throttle(self):
+        now = time.monotonic()
+        if self.last_throttle is not None and now - self.last_throttle < LLM_JUDGE_THROTTLE_COOLDOWN:
+            return
+        self.last_throttle = now
+        
+        # Account for the time already elapsed at the old rates before lowering them
+        self._refill()
+        self.rpm = max(self.rpm / 2, 1)
+        self.tpm = max(self.tpm / 2, 1)
+        self.available_requests = min(self.available_requests, self.rpm)
+        self.available_tokens = min(self.available_tokens, self.tpm)
+    
+    def recover(self):
+        # Requests already in flight when the API pushed back don't count as recovery
+        if self.last_throttle is not None and time.monotonic() - self.last_throttle < LLM_JUDGE_THROTTLE_COOLDOWN:
+            return
+        
+        # Refill at the lowered rates first so the time already elapsed isn't credited at the new ones
+        self._refill()
+        self.rpm = min(self.rpm + self.max_rpm * LLM_JUDGE_RECOVERY_STEP, self.max_rpm)
+        self.tpm = min(self.tpm + self.max_tpm * LLM_JUDGE_RECOVERY_STEP, self.max_tpm)
+
+
+def _judge_cache_key(model, temperature, user_prompt):
+    """Cache key for one judge request: hash of everything that determines the response"""
+    request = f"{model}|{temperature}|{LLM_JUDGE_SYSTEM_PROMPT}|{user_prompt}"
+    return hashlib.sha256(request.encode('utf-8')).hexdigest()
+
+
+class _JudgeCache:
+    """Successful LLM judge responses in a local SQLite file, keyed by _judge_cache_key"""
+    
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # Autocommit, so every stored evaluation survives an interrupted run
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS judge_cache (key TEXT PRIMARY KEY, evaluation BLOB NOT NULL)")
+    
+    def get(self, key):
+        row = self.conn.execute("SELECT evaluation FROM judge_cache WHERE key = ?", (key,)).fetchone()
+        return orjson.loads(row[0]) if row else None
+    
+    def set(self, key, evaluation):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO judge_cache (key, evaluation) VALUES (?, ?)",
+            (key, orjson.dumps(evaluation))
+        )
+    
+    def close(self):
+        self.conn.close()
+
+
+def _judge_user_prompt(values):
+    """Render the judge user prompt for one row's prompt column values, or return None if there is nothing to judge"""
+    fields = dict(zip(LLM_JUDGE_PROMPT_FIELDS, values))
+    
+    # Without the app's reason and background there is nothing to judge
+    blank = [name for name in LLM_JUDGE_REQUIRED_FIELDS if pd.isna(fields[name]) or not str(fields[name]).strip()]
+    if blank:
+        return None, f"Skipped: empty {', '.join(blank)}"
+    
+    # Format the user prompt with row data
+    user_prompt = render_prompt(LLM_JUDGE_USER_PROMPT, **fields)
+    
+    # Cut the retrieved context (the only unbounded field) so the prompt fits the token budget
+    excess_chars = len(user_prompt) - LLM_JUDGE_MAX_PROMPT_TOKENS * CHARS_PER_TOKEN
+    if excess_chars > 0:
+        context = str(fields['context'])
+        fields['context'] = context[:max(len(context) - excess_chars, 0)]
+        user_prompt = render_prompt(LLM_JUDGE_USER_PROMPT, **fields)
+    
+    return user_prompt, None
+
+
+def _prepare_judge_rows(df, model, temperature, cache=None):
+    """
+    Render each row's judge prompt and serve skipped rows and cache hits up front.
+    
+    Returns the per-row results list (None where the API still has to be asked) and the
+    pending (position, idx, user prompt, cache key) entries for those rows.
+    """
+    results = [None] * len(df)
+    pending = []
+    rows = df[list(LLM_JUDGE_PROMPT_FIELDS.values())].itertuples(index=False, name=None)
+    for position, (idx, values) in enumerate(zip(df.index, rows)):
+        try:
+            user_prompt, skipped = _judge_user_prompt(values)
+        except KeyError as e:
+            # Handle missing keys in format string
+            print(f"\n❌ Row {idx}: Missing required field - {e}")
+            results[position] = ({}, f'Missing field: {e}', False)
+            continue
+        
+        if skipped:
+            results[position] = ({}, skipped, False)
+            continue
+        
+        # Reuse an earlier judgement of the exact same row
+        cache_key = _judge_cache_key(model, temperature, user_prompt)
+        evaluation = cache.get(cache_key) if cache else None
+        if evaluation is not None:
+            results[position] = (evaluation, None, True)
+        else:
+            pending.append((position, idx, user_prompt, cache_key))
+    
+    return results, pending
+
+
+async def _judge_rows(df, model, temperature, max_concurrency, rate_limiter, cache=None, rows_per_call=1):
+    """Judge every row of df concurrently (bounded by a semaphore and the rate limiter), returning results in row order"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+    results, pending = _prepare_judge_rows(df, model, temperature, cache)
+    
+    async with AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=LLM_JUDGE_MAX_RETRIES) as client:
+        
+        async def call(system_prompt, user_prompt, n_rows):
+            for attempt in range(LLM_JUDGE_RATE_LIMIT_ATTEMPTS):
+                try:
+                    async with semaphore:
+                        await rate_limiter.acquire(
+                            (len(system_prompt) + len(user_prompt)) // CHARS_PER_TOKEN
+                            + LLM_JUDGE_OUTPUT_TOKENS * n_rows
+                        )
+                        response = await llm_async(
+                            system_prompt=system_prompt,
+                            user_prompt=user_prompt,
+                            client=client,
+                            model=model,
+                            temperature=temperature
+                        )
+                    rate_limiter.recover()
+                    return response
+                except RateLimitError:
+                    # Still limited after the client's retries: slow every task down, then back off
+                    rate_limiter.throttle()
+                    if attempt == LLM_JUDGE_RATE_LIMIT_ATTEMPTS - 1:
+                        raise
+                    await asyncio.sleep(2 ** attempt)
+        
+        def record(position, idx, cache_key, evaluation):
+            # Check if LLM returned an error
+            if 'error' in evaluation:
+                error = evaluation.get('error', 'Unknown error')
+                print(f"\n⚠️  Row {idx}: LLM returned error - {error}")
+                results[position] = (evaluation, error, False)
+                return
+            
+            if cache:
+                cache.set(cache_key, evaluation)
+            results[position] = (evaluation, None, False)
+        
+        async def judge(chunk):
+            if len(chunk) > 1:
+                try:
+                    # All rows of the chunk in one request, answered as {"results": [...]} in item order
+                    response = await call(
+                        LLM_JUDGE_SYSTEM_PROMPT + LLM_JUDGE_BATCH_SYSTEM_PROMPT,
+                        ''.join(
+                            render_prompt(LLM_JUDGE_BATCH_ITEM_PROMPT, number=number, prompt=user_prompt)
+                            for number, (_, _, user_prompt, _) in enumerate(chunk, start=1)
+                        ),
+                        len(chunk)
+                    )
+                    evaluations = response.get('results')
+                    if (isinstance(evaluations, list) and len(evaluations) == len(chunk)
+                            and all(isinstance(evaluation, dict) for evaluation in evaluations)):
+                        for (position, idx, _, cache_key), evaluation in zip(chunk, evaluations):
+                            record(position, idx, cache_key, evaluation)
+                        return
+                except Exception as e:
+                    print(f"\n⚠️  Rows {chunk[0][1]}..{chunk[-1][1]}: batched request failed - {e}")
+                
+                # The reply did not line up with the rows: fall back to one request per row
+            
+            for position, idx, user_prompt, cache_key in chunk:
+                try:
+                    record(position, idx, cache_key, await call(LLM_JUDGE_SYSTEM_PROMPT, user_prompt, 1))
+                except Exception as e:
+                    # Catch all other exceptions
+                    print(f"\n❌ Row {idx}: Unexpected error - {e}")
+                    results[position] = ({}, str(e), False)
+        
+        # Progress bar advances as requests complete; results are stored by row position
+        rows_per_call = max(rows_per_call, 1)
+        await tqdm_asyncio.gather(
+            *(judge(pending[i:i + rows_per_call]) for i in range(0, len(pending), rows_per_call)),
+            desc=f"Running {model} evaluations"
+        )
+    
+    return results
+
+# LLM judge labels (lowercased) and their binary score
+BINARY_MAP = {'yes': 1, 'good': 1, 'no': 0, 'bad': 0}
+
+def binarize_scores(scores):
+    """
+    Convert a whole column of LLM judge labels to binary scores (Yes/Good -> 1, No/Bad -> 0).
+    
+    Args:
+        scores: Series of labels ('Yes'/'No', 'Good'/'Bad', possibly missing)
+    
+    Returns:
+        float32 Series of 1/0, NaN where the label is missing or unrecognized
+    """
+    labels = scores.astype(str).str.strip().str.lower()
+    return labels.map(BINARY_MAP).astype('float32')
+
+
 def convert_to_binary(value):
-    value_str = str(value).lower().strip()
-    return 1 if value_str in ['yes', 'good'] else (0 if value_str in ['no', 'bad'] else np.nan)
+    """Scalar version of binarize_scores: 1 for Yes/Good, 0 for No/Bad, NaN otherwise"""
+    return BINARY_MAP.get(str(value).lower().strip(), np.nan)
+
+
+def _binary_score_sql(column):
+    """SQL mean of a stored judge label column scored like binarize_scores (unknown labels ignored)"""
+    cases = ' '.join(f"WHEN '{label}' THEN {score}" for label, score in BINARY_MAP.items())
+    return f"AVG(CASE LOWER(TRIM({column})) {cases} END)"
+
 
 def get_date_filter(args):
     """
@@ -205,26 +729,65 @@ def get_date_filter(args):
         yesterday_str = yesterday.strftime('%Y-%m-%d')
         return yesterday_str, yesterday_str
 
-def load_feedback_data(conn, start_date, end_date):
+def load_feedback_data(conn, start_date, end_date, chunk_size=FEEDBACK_FETCH_CHUNK_SIZE,
+                       skip_already_evaluated=True):
     """
     Load feedback data from database for specified date range.
     
+    Rows are streamed through a server-side cursor chunk_size at a time, so a long
+    backfill range never has to be buffered in full as raw driver tuples.
+    
+    The dates are matched as a half-open timestamp range rather than through DATE(timestamp),
+    so Postgres can serve it from idx_feedback_timestamp (see schemas/ingestion_schema.sql).
+    
+    By default feedback that already has a judged row in 'evaluations' is left out, so the
+    daily run only pays for new feedback; rows stored without any judge score (LLM errors,
+    exhausted retries, failed batch requests) are picked up again and retried. Rows skipped
+    for an empty reason or background also have no scores, but the feedback itself marks them,
+    so they count as evaluated once stored. Pass skip_already_evaluated=False to re-evaluate
+    everything.
+    
     Args:
         conn: Database connection
         start_date: Start date string (YYYY-MM-DD)
         end_date: End date string (YYYY-MM-DD)
+        chunk_size: Rows fetched per round trip (default: FEEDBACK_FETCH_CHUNK_SIZE)
+        skip_already_evaluated: Leave out feedback that was successfully judged before (default: True)
     
     Returns:
         DataFrame with feedback data
     """
-    query = """
-        SELECT * FROM feedback 
-        WHERE DATE(timestamp) >= %s 
-          AND DATE(timestamp) <= %s
-        ORDER BY timestamp DESC
+    # Same test as _judge_user_prompt: a required field that is NULL or only whitespace
+    nothing_to_judge = ' OR '.join(
+        f"COALESCE(f.{LLM_JUDGE_PROMPT_FIELDS[name]}, '') !~ '\\S'" for name in LLM_JUDGE_REQUIRED_FIELDS
+    )
+    query = f"""
+        SELECT {', '.join(f'f.{col}' for col in FEEDBACK_COLUMNS)} FROM feedback f
+        WHERE f.timestamp >= %s::date
+          AND f.timestamp < %s::date + INTERVAL '1 day'
+          AND (%s OR NOT EXISTS (
+              SELECT 1 FROM evaluations e
+              WHERE e.feedback_id = f.id
+                AND (COALESCE(e.grading_context_score, e.grading_accuracy_score,
+                              e.background_quality_score, e.background_context_score) IS NOT NULL
+                     OR {nothing_to_judge})
+          ))
+        ORDER BY f.timestamp DESC
     """
     
-    df = pd.read_sql(query, conn, params=(start_date, end_date))
+    chunks = []
+    with conn.cursor(name='feedback_stream') as cur:
+        cur.itersize = chunk_size
+        cur.execute(query, (start_date, end_date, not skip_already_evaluated))
+        for rows in iter(lambda: cur.fetchmany(chunk_size), []):
+            chunks.append(pd.DataFrame(rows, columns=FEEDBACK_COLUMNS))
+    
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=FEEDBACK_COLUMNS)
+    
+    # Low-cardinality labels are stored as small integer codes
+    for col in FEEDBACK_CATEGORICAL_COLUMNS:
+        df[col] = df[col].astype('category')
+    
     return df
 
 def save_evaluation_results(df, conn):
@@ -245,135 +808,113 @@ def save_evaluation_results(df, conn):
         # Insert individual evaluation results
         print("\n💾 Saving individual evaluation results...")
         
-        for _, row in df.iterrows():
-            cur.execute("""
-                INSERT INTO evaluations (
-                    feedback_id,
-                    evaluation_date,
-                    question,
-                    correct_answers,
-                    user_answer,
-                    user_state,
-                    success,
-                    reason,
-                    user_feedback,
-                    background_word_count,
-                    reason_background_similarity,
-                    grading_context_score,
-                    grading_context_reason,
-                    grading_accuracy_score,
-                    grading_accuracy_reason,
-                    background_quality_score,
-                    background_quality_reason,
-                    background_context_score,
-                    background_context_reason,
-                    feedback_timestamp, 
-                    evaluation_version
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (feedback_id) 
-                DO UPDATE SET
-                    question = EXCLUDED.question,
-                    correct_answers = EXCLUDED.correct_answers,
-                    user_answer = EXCLUDED.user_answer,
-                    user_state = EXCLUDED.user_state,
-                    success = EXCLUDED.success,
-                    reason = EXCLUDED.reason,
-                    user_feedback = EXCLUDED.user_feedback,
-                    background_word_count = EXCLUDED.background_word_count,
-                    reason_background_similarity = EXCLUDED.reason_background_similarity,
-                    grading_context_score = EXCLUDED.grading_context_score,
-                    grading_context_reason = EXCLUDED.grading_context_reason,
-                    grading_accuracy_score = EXCLUDED.grading_accuracy_score,
-                    grading_accuracy_reason = EXCLUDED.grading_accuracy_reason,
-                    background_quality_score = EXCLUDED.background_quality_score,
-                    background_quality_reason = EXCLUDED.background_quality_reason,
-                    background_context_score = EXCLUDED.background_context_score,
-                    background_context_reason = EXCLUDED.background_context_reason,
-                    feedback_timestamp = EXCLUDED.feedback_timestamp,
-                    evaluation_version = EXCLUDED.evaluation_version,
-                    created_at = NOW()
-            """, (
-                row.get('id'),  # feedback_id from original feedback table
-                pd.to_datetime(row.get('timestamp')).date(),
-                row.get('question_text'),
-                row.get('correct_answers'),
-                row.get('user_answer'),
-                row.get('user_state'),
-                row.get('success'),
-                row.get('reason'),
-                row.get('feedback_type'),
-                row.get('background_info_word_count'),
-                row.get('reason_bkg_info_similarity'),
-                row.get('llm_judge_grading_context_usage'),
-                row.get('llm_judge_grading_context_usage_reason'),
-                row.get('llm_judge_grading_accuracy'),
-                row.get('llm_judge_grading_accuracy_reason'),
-                row.get('llm_judge_background_info_quality'),
-                row.get('llm_judge_background_info_quality_reason'),
-                row.get('llm_judge_background_context_usage'),
-                row.get('llm_judge_background_context_usage_reason'),
-                row.get('timestamp'),
-                'v1.0'  # version tracking for evaluation logic
-            ))
+        df['eval_date'] = pd.to_datetime(df['timestamp']).dt.date
+        
+        # Build every row up front and send them as multi-VALUES statements; missing values
+        # (NaN from categorical or numeric columns) must go out as None so they land as NULL
+        source = df[EVALUATION_SOURCE_COLUMNS].astype(object)
+        source = source.where(source.notna(), None)
+        evaluation_rows = [
+            row + ('v1.0',)  # version tracking for evaluation logic
+            for row in source.itertuples(index=False, name=None)
+        ]
+        execute_values(cur, """
+            INSERT INTO evaluations (
+                feedback_id,
+                evaluation_date,
+                question,
+                correct_answers,
+                user_answer,
+                user_state,
+                success,
+                reason,
+                user_feedback,
+                background_word_count,
+                reason_background_similarity,
+                grading_context_score,
+                grading_context_reason,
+                grading_accuracy_score,
+                grading_accuracy_reason,
+                background_quality_score,
+                background_quality_reason,
+                background_context_score,
+                background_context_reason,
+                feedback_timestamp, 
+                evaluation_version
+            ) VALUES %s
+            ON CONFLICT (feedback_id) 
+            DO UPDATE SET
+                question = EXCLUDED.question,
+                correct_answers = EXCLUDED.correct_answers,
+                user_answer = EXCLUDED.user_answer,
+                user_state = EXCLUDED.user_state,
+                success = EXCLUDED.success,
+                reason = EXCLUDED.reason,
+                user_feedback = EXCLUDED.user_feedback,
+                background_word_count = EXCLUDED.background_word_count,
+                reason_background_similarity = EXCLUDED.reason_background_similarity,
+                grading_context_score = EXCLUDED.grading_context_score,
+                grading_context_reason = EXCLUDED.grading_context_reason,
+                grading_accuracy_score = EXCLUDED.grading_accuracy_score,
+                grading_accuracy_reason = EXCLUDED.grading_accuracy_reason,
+                background_quality_score = EXCLUDED.background_quality_score,
+                background_quality_reason = EXCLUDED.background_quality_reason,
+                background_context_score = EXCLUDED.background_context_score,
+                background_context_reason = EXCLUDED.background_context_reason,
+                feedback_timestamp = EXCLUDED.feedback_timestamp,
+                evaluation_version = EXCLUDED.evaluation_version,
+                created_at = NOW()
+        """, evaluation_rows, page_size=INSERT_PAGE_SIZE)
         
         print(f"✅ Saved {len(df)} individual evaluation results")
         
         # Calculate and insert daily aggregates
         print("\n📊 Calculating daily aggregates...")
         
-        # Group by date
-        df['eval_date'] = pd.to_datetime(df['timestamp']).dt.date
-        
-        for date, group in df.groupby('eval_date'):
-            # Calculate aggregates for this specific date
-            total_feedback = len(group)
-            positive_feedback_rate = (group['feedback_type'] == 'positive').mean()
-            mean_background_word_count = group['background_info_word_count'].mean()
-            mean_similarity = group['reason_bkg_info_similarity'].mean()
-            
-            # Qualitative metrics (using your binary columns)
-            grading_context_pass_rate = (group['grading_context_binary'].mean() or 0)
-            grading_accuracy_pass_rate = (group['grading_accuracy_binary'].mean() or 0)
-            background_quality_pass_rate = (group['background_quality_binary'].mean() or 0)
-            background_context_pass_rate = (group['background_context_binary'].mean() or 0)
-            
-            cur.execute("""
-                INSERT INTO daily_metrics_summary (
-                    date,
-                    feedback_count,
-                    positive_feedback_rate,
-                    mean_background_word_count,
-                    mean_similarity,
-                    grading_context_pass_rate,
-                    grading_accuracy_pass_rate,
-                    background_quality_pass_rate,
-                    background_context_pass_rate
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (date) 
-                DO UPDATE SET
-                    feedback_count = EXCLUDED.feedback_count,
-                    positive_feedback_rate = EXCLUDED.positive_feedback_rate,
-                    mean_background_word_count = EXCLUDED.mean_background_word_count,
-                    mean_similarity = EXCLUDED.mean_similarity,
-                    grading_context_pass_rate = EXCLUDED.grading_context_pass_rate,
-                    grading_accuracy_pass_rate = EXCLUDED.grading_accuracy_pass_rate,
-                    background_quality_pass_rate = EXCLUDED.background_quality_pass_rate,
-                    background_context_pass_rate = EXCLUDED.background_context_pass_rate,
-                    calculated_at = NOW()
-            """, (
+        # Recompute each affected date from everything stored for it, so runs that only
+        # evaluated new feedback still produce whole-day aggregates
+        eval_dates = sorted(df['eval_date'].dropna().unique())
+        cur.execute(f"""
+            INSERT INTO daily_metrics_summary (
                 date,
-                int(total_feedback),
-                float(positive_feedback_rate),
-                float(mean_background_word_count),
-                float(mean_similarity),
-                float(grading_context_pass_rate),
-                float(grading_accuracy_pass_rate),
-                float(background_quality_pass_rate),
-                float(background_context_pass_rate)
-            ))
+                feedback_count,
+                positive_feedback_rate,
+                mean_background_word_count,
+                mean_similarity,
+                grading_context_pass_rate,
+                grading_accuracy_pass_rate,
+                background_quality_pass_rate,
+                background_context_pass_rate
+            )
+            SELECT
+                evaluation_date,
+                COUNT(*),
+                AVG(CASE WHEN user_feedback = 'positive' THEN 1 ELSE 0 END),
+                AVG(background_word_count),
+                AVG(reason_background_similarity),
+                {_binary_score_sql('grading_context_score')},
+                {_binary_score_sql('grading_accuracy_score')},
+                {_binary_score_sql('background_quality_score')},
+                {_binary_score_sql('background_context_score')}
+            FROM evaluations
+            WHERE evaluation_date = ANY(%s::date[])
+            GROUP BY evaluation_date
+            ON CONFLICT (date) 
+            DO UPDATE SET
+                feedback_count = EXCLUDED.feedback_count,
+                positive_feedback_rate = EXCLUDED.positive_feedback_rate,
+                mean_background_word_count = EXCLUDED.mean_background_word_count,
+                mean_similarity = EXCLUDED.mean_similarity,
+                grading_context_pass_rate = EXCLUDED.grading_context_pass_rate,
+                grading_accuracy_pass_rate = EXCLUDED.grading_accuracy_pass_rate,
+                background_quality_pass_rate = EXCLUDED.background_quality_pass_rate,
+                background_context_pass_rate = EXCLUDED.background_context_pass_rate,
+                calculated_at = NOW()
+        """, (eval_dates,))
+        daily_count = cur.rowcount
         
         conn.commit()
-        print(f"✅ Saved daily aggregates for {len(df.groupby('eval_date'))} date(s)")
+        print(f"✅ Saved daily aggregates for {daily_count} date(s)")
         
     except Exception as e:
         conn.rollback()
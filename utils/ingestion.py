@@ -1,7 +1,10 @@
 import os
 import re
 import uuid
+import hashlib
+import orjson
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
 from bs4 import BeautifulSoup
 from typing import List, Dict, Any
@@ -10,6 +13,35 @@ from utils.io import save_to_json
 from utils.rag import llm
 from utils.prompts import CIVICS_QA_UPDATING_PROMPT
 
+# On-disk cache of PDF extraction results, keyed on the PDF's SHA-256 (relative to the project root)
+EXTRACT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'extract')
+
+
+def _file_sha256(filename: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents."""
+    
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _load_extract_cache(cache_dir: str, key: str):
+    """Return the cached result for key, or None on a miss."""
+    
+    cache_file = os.path.join(cache_dir, f"{key}.json")
+    if not os.path.exists(cache_file):
+        return None
+    
+    with open(cache_file, "rb") as f:
+        return orjson.loads(f.read())
+
+
+def _save_extract_cache(cache_dir: str, key: str, data) -> None:
+    """Store a result under key in the extraction cache."""
+    
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(os.path.join(cache_dir, f"{key}.json"), "wb") as f:
+        f.write(orjson.dumps(data))
+
 def download_civics_documents(save_dir: str = "../documents/") -> Dict[str, any]:
     """
     Download US Civics Test PDFs and study guide from USCIS.
@@ -66,8 +98,7 @@ def download_civics_documents(save_dir: str = "../documents/") -> Dict[str, any]
     # Download all documents
     all_documents = tests + [guide]
     
-    print("Downloading civics documents...")
-    for doc in all_documents:
+    def download(doc):
         url = doc["url"]
         filename = os.path.join(save_dir, f"{doc['test_type']}.pdf")
         
@@ -86,12 +117,6 @@ def download_civics_documents(save_dir: str = "../documents/") -> Dict[str, any]
             # Add filename to result
             doc["filename"] = filename
             
-            # Categorize result
-            if doc == guide:
-                results["guide"] = doc
-            else:
-                results["tests"].append(doc)
-            
         except requests.exceptions.RequestException as e:
             print(f"    ✗ Error downloading {doc['test_type']}: {str(e)}")
             raise
@@ -99,6 +124,15 @@ def download_civics_documents(save_dir: str = "../documents/") -> Dict[str, any]
             print(f"    ✗ Error saving {filename}: {str(e)}")
             raise
     
+    # Download all documents at once (network-bound); any failure is re-raised here
+    print("Downloading civics documents...")
+    with ThreadPoolExecutor(max_workers=len(all_documents)) as executor:
+        list(executor.map(download, all_documents))
+    
+    # Categorize results (in their original order)
+    results["tests"].extend(tests)
+    results["guide"] = guide
+    
     print(f"\n✓ Successfully downloaded {len(results['tests'])} tests and 1 guide")
     
     return results
@@ -590,7 +624,8 @@ from typing import List, Dict, Any
 
 def process_civics_tests(
     download_info: Dict[str, Any],
-    save_dir: str = '../documents/'
+    save_dir: str = '../documents/',
+    cache_dir: str = EXTRACT_CACHE_DIR
 ) -> Dict[str, List[Dict[str, Any]]]:
     """
     Process civics test PDFs: parse Q&A pairs, populate missing answers, and save to JSON.
@@ -603,6 +638,7 @@ def process_civics_tests(
         download_info: Dictionary from download_civics_documents() containing:
             - "tests" (List[Dict]): List of test metadata with "test_type" keys
         save_dir: Directory where PDFs are located and JSON files will be saved
+        cache_dir: Directory of cached results keyed on PDF hash and date, or None to disable (default: EXTRACT_CACHE_DIR)
         
     Returns:
         Dict mapping test types to their processed Q&A pairs:
@@ -639,14 +675,24 @@ def process_civics_tests(
             continue
         
         try:
-            # Parse the Q&A from the PDF
-            print(f"    • Parsing PDF...")
-            qa_pairs = parse_clean_qa_pdf(pdf_filename)
-            print(f"    • Extracted {len(qa_pairs)} questions")
+            # Officeholder answers depend on the date, so key on it as well as the PDF
+            cache_key = f"{_file_sha256(pdf_filename)}_{date.today().isoformat()}" if cache_dir else None
+            qa_pairs = _load_extract_cache(cache_dir, cache_key) if cache_dir else None
             
-            # Replace variable/undefined answers with latest info
-            print(f"    • Populating missing answers...")
-            qa_pairs = populate_missing_questions(qa_pairs)
+            if qa_pairs is not None:
+                print(f"    • Loaded {len(qa_pairs)} questions from cache")
+            else:
+                # Parse the Q&A from the PDF
+                print(f"    • Parsing PDF...")
+                qa_pairs = parse_clean_qa_pdf(pdf_filename)
+                print(f"    • Extracted {len(qa_pairs)} questions")
+                
+                # Replace variable/undefined answers with latest info
+                print(f"    • Populating missing answers...")
+                qa_pairs = populate_missing_questions(qa_pairs)
+                
+                if cache_dir:
+                    _save_extract_cache(cache_dir, cache_key, qa_pairs)
             
             # Save to JSON
             json_filename = os.path.join(save_dir, f"{test_type}_qa_pairs.json")
@@ -663,7 +709,7 @@ def process_civics_tests(
     print(f"\n✓ Processed {len(all_qa_pairs)} tests successfully")
     return all_qa_pairs
 
-def extract_clean_text_from_guide(filename: str) -> str:
+def extract_clean_text_from_guide(filename: str, cache_dir: str = EXTRACT_CACHE_DIR) -> str:
     """
     Extract and clean text from the US Civics Test guide PDF.
     
@@ -672,6 +718,7 @@ def extract_clean_text_from_guide(filename: str) -> str:
     
     Args:
         filename: Path to the civics guide PDF file
+        cache_dir: Directory of cached results keyed on PDF hash, or None to disable (default: EXTRACT_CACHE_DIR)
         
     Returns:
         str: Cleaned text content from the PDF, with filtered pages joined by newlines
@@ -689,6 +736,14 @@ def extract_clean_text_from_guide(filename: str) -> str:
         >>> print(len(text))
         45000
     """
+    # Unchanged guides skip the parse entirely
+    cache_key = f"guide_{_file_sha256(filename)}" if cache_dir else None
+    if cache_dir:
+        cached = _load_extract_cache(cache_dir, cache_key)
+        if cached is not None:
+            print(f"Loaded {len(cached)} guide segments from cache")
+            return cached
+    
     reader = PdfReader(filename)
     all_text = []
     
@@ -794,6 +849,9 @@ def extract_clean_text_from_guide(filename: str) -> str:
             "text" : text
             }
         data.append(entry)
+    
+    if cache_dir:
+        _save_extract_cache(cache_dir, cache_key, data)
 
     return data
 
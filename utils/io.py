@@ -1,5 +1,5 @@
-import json
 import os
+import orjson
 from typing import Dict, Any, List, Union
 
 
@@ -9,8 +9,8 @@ def save_to_json(savefile: str, qa_pairs: Dict) -> None:
     # Create directory if it doesn't exist
     os.makedirs(os.path.dirname(savefile) or '.', exist_ok=True)
     
-    with open(savefile, "w", encoding="utf-8") as f:
-        json.dump(qa_pairs, f, ensure_ascii=False, indent=2)
+    with open(savefile, "wb") as f:
+        f.write(orjson.dumps(qa_pairs, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY))
 
     print(f"Data saved to {savefile}")
 
@@ -18,8 +18,8 @@ def save_to_json(savefile: str, qa_pairs: Dict) -> None:
 def load_from_json(filepath: str) -> Union[Dict[str, Any], List[Any]]:
     """Load data from a JSON file."""
     
-    with open(filepath, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    with open(filepath, "rb") as f:
+        data = orjson.loads(f.read())
     
     print(f"Data loaded from {filepath}")
     return data
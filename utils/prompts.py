@@ -2,6 +2,38 @@
 Prompt templates for LLM interactions.
 """
 
+import string
+from functools import lru_cache
+
+
+@lru_cache(maxsize=32)
+def _compile_prompt(template: str):
+    """Split a str.format template once into (literal text, placeholder name) pairs.
+    Returns None for templates using anything beyond plain {name} placeholders."""
+    parts = []
+    for literal, field, format_spec, conversion in string.Formatter().parse(template):
+        if field is not None and (format_spec or conversion or not field.isidentifier()):
+            return None
+        parts.append((literal, field))
+    return tuple(parts)
+
+
+def render_prompt(template: str, **values) -> str:
+    """
+    Fill in a prompt template; same result as template.format(**values), but the template is parsed only once.
+    
+    Raises:
+        KeyError: If the template has a placeholder that isn't provided
+    """
+    parts = _compile_prompt(template)
+    if parts is None:
+        return template.format(**values)
+    
+    return "".join(
+        literal if field is None else literal + str(values[field])
+        for literal, field in parts
+    )
+
 CIVICS_QA_UPDATING_PROMPT = """ 
 For the given question, return the most recent applicable response as of {today}.
 
@@ -698,4 +730,30 @@ Evaluate the following chatbot interaction **independently for each criterion**.
 <background_info>
 {background_info}
 </background_info>
-"""
\ No newline at end of file
+"""
+
+
+LLM_JUDGE_BATCH_SYSTEM_PROMPT = """
+---
+
+### MULTIPLE INTERACTIONS
+
+The user message may contain several interactions, each headed `### ITEM <n>`.
+Evaluate every item **independently**, exactly as described above, and return one JSON object per item, in item order:
+
+```json
+{
+  "results": [
+    { ...evaluation for ITEM 1... },
+    { ...evaluation for ITEM 2... }
+  ]
+}
+```
+"""
+
+
+
+LLM_JUDGE_BATCH_ITEM_PROMPT = """
+### ITEM {number}
+{prompt}
+"""
@@ -69,13 +69,15 @@ def create_qdrant_collection(
 def create_embedded_points(
     datapoints: List[Dict[str, Any]],
     openai_client: OpenAI,
-    model: str = "text-embedding-3-small"
+    model: str = "text-embedding-3-small",
+    batch_size: int = 512
 ) -> List[PointStruct]:
     """
     Create embedded points from datapoints for Qdrant vector storage.
     
     Takes a list of datapoints with text content, generates embeddings using OpenAI's
-    API, and creates PointStruct objects ready for insertion into Qdrant.
+    API, and creates PointStruct objects ready for insertion into Qdrant. Texts are
+    sent to the embeddings endpoint in batches of up to `batch_size` inputs per request.
     
     Args:
         datapoints: List of dictionaries, each containing:
@@ -84,6 +86,7 @@ def create_embedded_points(
             - "page_no" (int): Page number reference
         openai_client: OpenAI client instance for generating embeddings
         model: OpenAI embedding model to use (default: "text-embedding-3-small")
+        batch_size: Max inputs per embeddings request (default: 512, API limit: 2048)
         
     Returns:
         List[PointStruct]: List of Qdrant points ready for insertion
@@ -98,7 +101,8 @@ def create_embedded_points(
         KeyError: If required keys are missing from datapoints
         Exception: If OpenAI API call fails
     """
-    points = []
+    # Collect the valid, non-empty datapoints first
+    entries = []
     
     for datapoint in datapoints:
         try:
@@ -106,32 +110,43 @@ def create_embedded_points(
             page_number = datapoint['page_no']
             id = str(datapoint["uuid"])
             page_text = datapoint['text']
-
-            if page_text.strip():
-                # Get embedding from OpenAI
-                response = openai_client.embeddings.create(
-                    model=model,
-                    input=page_text
-                )
-                embedding = response.data[0].embedding
-                
-                points.append(PointStruct(
-                    id=id,
-                    vector=embedding,
-                    payload={
-                        "page_number": page_number,
-                        "text": page_text,
-                        "source": "USCIS Civics Textbook"
-                    }
-                ))
-                
+            
         except KeyError as e:
             print(f"✗ Error: Missing required key {e} in datapoint, skipping...")
             continue
+        
+        if page_text.strip():
+            entries.append((id, page_text, page_number))
+    
+    points = []
+    
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start:start + batch_size]
+        
+        try:
+            # Get embeddings from OpenAI (one request per batch)
+            response = openai_client.embeddings.create(
+                model=model,
+                input=[page_text for _, page_text, _ in batch]
+            )
             
         except Exception as e:
             print(f"✗ Error: Could not create embedding - {str(e)}")
             raise
+        
+        # Results carry their input index, so match on it rather than on order
+        embeddings = {item.index: item.embedding for item in response.data}
+        
+        for i, (id, page_text, page_number) in enumerate(batch):
+            points.append(PointStruct(
+                id=id,
+                vector=embeddings[i],
+                payload={
+                    "page_number": page_number,
+                    "text": page_text,
+                    "source": "USCIS Civics Textbook"
+                }
+            ))
 
     print(f"✓ Created {len(points)} embedded points")
-    return points
\ No newline at end of file
+    return points
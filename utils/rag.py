@@ -1,26 +1,58 @@
 import os
 import json
-from typing import Dict, Any
-from openai import OpenAI
+import numpy as np
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Iterator
+from openai import OpenAI, AsyncOpenAI, RateLimitError
 from dotenv import load_dotenv
 from qdrant_client import QdrantClient
+from .prompts import render_prompt
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize clients with API keys from .env
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-qdrant_client = QdrantClient(
-    url=os.getenv("QDRANT_URL"),
-    api_key=os.getenv("QDRANT_API_KEY")
-)
-
 # Constants
 DEFAULT_COLLECTION = "usa_civics_guide"
 DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
 DEFAULT_LLM_MODEL = "gpt-4o-mini"
 
 
+@lru_cache(maxsize=None)
+def get_openai_client() -> OpenAI:
+    """Create the OpenAI client once (API key from .env) and reuse it for every call."""
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+
+@lru_cache(maxsize=None)
+def get_qdrant_client() -> QdrantClient:
+    """Create the Qdrant client once (URL and API key from .env) and reuse it for every call."""
+    return QdrantClient(
+        url=os.getenv("QDRANT_URL"),
+        api_key=os.getenv("QDRANT_API_KEY")
+    )
+
+
+def embed_texts(
+    texts: List[str],
+    embedding_model: str = DEFAULT_EMBEDDING_MODEL
+) -> np.ndarray:
+    """
+    Embed several texts with a single OpenAI embeddings request.
+    
+    Args:
+        texts: Texts to embed
+        embedding_model: OpenAI embedding model to use
+    
+    Returns:
+        float32 array of shape (len(texts), dimension), one row per text in input order
+    """
+    response = get_openai_client().embeddings.create(
+        model=embedding_model,
+        input=texts
+    )
+    return np.array([item.embedding for item in response.data], dtype=np.float32)
+
+
 def get_context(
     question: str,
     collection_name: str = DEFAULT_COLLECTION,
@@ -28,7 +60,8 @@ def get_context(
     limit: int = 2,
     score_threshold: float = 0.5,
     query_expansion: bool = False,
-    expansion_terms: dict = None 
+    expansion_terms: dict = None,
+    query_embedding: Optional[List[float]] = None
 ) -> str:
     """
     Retrieve relevant context from Qdrant based on a question.
@@ -41,6 +74,8 @@ def get_context(
         score_threshold: Minimum similarity score (0-1) for results
         query_expansion: If True, expand query with related civics terms
         expansion_terms: Dictionary of expansion terms (loaded externally for efficiency)
+        query_embedding: Precomputed embedding of the question. When given, the question is
+            neither expanded nor embedded again.
     
     Returns:
         Formatted string containing relevant page contexts
@@ -51,20 +86,23 @@ def get_context(
     if not question or not question.strip():
         raise ValueError("Question cannot be empty")
     
-    # Apply query expansion if requested
-    if query_expansion and expansion_terms:
-        from .io import expand_query
-        question = expand_query(question, expansion_terms)
-    
-    # Embed the question
-    embedding_response = openai_client.embeddings.create(
-        model=embedding_model,
-        input=question
-    )
-    question_embedding = embedding_response.data[0].embedding
+    if query_embedding is not None:
+        question_embedding = np.asarray(query_embedding, dtype=np.float32).tolist()
+    else:
+        # Apply query expansion if requested
+        if query_expansion and expansion_terms:
+            from .io import expand_query
+            question = expand_query(question, expansion_terms)
+        
+        # Embed the question
+        embedding_response = get_openai_client().embeddings.create(
+            model=embedding_model,
+            input=question
+        )
+        question_embedding = embedding_response.data[0].embedding
 
     # Search Qdrant for relevant pages
-    search_results = qdrant_client.query_points(
+    search_results = get_qdrant_client().query_points(
         collection_name=collection_name,
         query=question_embedding,
         limit=limit,
@@ -106,7 +144,7 @@ def llm(
         return {"error": "Both system_prompt and user_prompt are required"}
     
     try:
-        completion = openai_client.chat.completions.create(
+        completion = get_openai_client().chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -116,22 +154,105 @@ def llm(
             temperature=temperature,
         )
 
-        response_text = completion.choices[0].message.content
+        return parse_llm_output(completion.choices[0].message.content)
+
+    except Exception as e:
+        return {"error": str(e)}
+
 
-        try:
-            data = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            return {
-                "error": f"Failed to parse JSON response: {e}",
-                "raw_output": response_text
-            }
+async def llm_async(
+    system_prompt: str,
+    user_prompt: str,
+    client: AsyncOpenAI,
+    model: str = DEFAULT_LLM_MODEL,
+    temperature: float = 0.3,
+) -> Dict[str, Any]:
+    """
+    Async variant of llm(), for running many calls concurrently over one AsyncOpenAI client.
+    
+    Args:
+        system_prompt: The system message that defines the assistant's behavior and role
+        user_prompt: The user message containing the question and any context
+        client: AsyncOpenAI client (bound to the running event loop)
+        model: OpenAI model to use (default: gpt-4o-mini)
+        temperature: default is 0.3
+    
+    Returns:
+        The LLM's parsed JSON output as a dict. If parsing fails, returns {"error": "..."}.
+    
+    Raises:
+        RateLimitError: If the API is still rate limiting after the client's own retries
+    """
+    if not system_prompt or not user_prompt:
+        return {"error": "Both system_prompt and user_prompt are required"}
+    
+    try:
+        completion = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
+            ],
+            response_format={"type": "json_object"},
+            temperature=temperature,
+        )
 
-        return data
+        return parse_llm_output(completion.choices[0].message.content)
 
+    except RateLimitError:
+        # Left to the caller, which can slow down its request rate
+        raise
     except Exception as e:
         return {"error": str(e)}
 
 
+def llm_stream(
+    system_prompt: str,
+    user_prompt: str,
+    model: str = DEFAULT_LLM_MODEL,
+    temperature: float = 0.3,
+) -> Iterator[str]:
+    """
+    Streaming variant of llm(): yields the raw JSON response text piece by piece as it is generated.
+    
+    Args:
+        system_prompt: The system message that defines the assistant's behavior and role
+        user_prompt: The user message containing the question and any context
+        model: OpenAI model to use (default: gpt-4o-mini)
+        temperature: default is 0.3
+    
+    Yields:
+        Text deltas; joined together they form the same JSON text llm() would parse
+    """
+    stream = get_openai_client().chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ],
+        response_format={"type": "json_object"},
+        temperature=temperature,
+        stream=True,
+    )
+
+    for chunk in stream:
+        if chunk.choices:
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+
+def parse_llm_output(response_text: str) -> Dict[str, Any]:
+    """Parse the LLM's JSON output into a dict, or return {"error": ..., "raw_output": ...} if it isn't valid JSON."""
+    try:
+        return json.loads(response_text)
+    except json.JSONDecodeError as e:
+        return {
+            "error": f"Failed to parse JSON response: {e}",
+            "raw_output": response_text
+        }
+
+
 def rag(
     user_prompt: str,
     system_prompt: str,
@@ -144,7 +265,9 @@ def rag(
     context_limit: int = 2,
     score_threshold: float = 0.5,
     query_expansion: bool = False,
-    temperature: float = 0.5
+    temperature: float = 0.5,
+    question_embedding: Optional[List[float]] = None,
+    context: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Complete RAG pipeline for Q&A with context retrieval.
@@ -162,6 +285,8 @@ def rag(
         score_threshold: Minimum similarity score (0-1) for results
         query_expansion: If True, expand query with related civics terms
         temperature: default is 0.3 
+        question_embedding: Precomputed embedding of the question (skips the embeddings call)
+        context: Already retrieved context for the question (skips retrieval altogether)
     
     Returns:
         Dict containing:
@@ -178,67 +303,164 @@ def rag(
         ...     user_answer="B"
         ... )
     """
+    qna_user_prompt = user_prompt
     try:
-        # Get context from Qdrant
-        context = get_context(
+        context, qna_user_prompt = build_rag_prompt(
+            user_prompt=user_prompt,
             question=question,
+            answers=answers,
+            user_state=user_state,
+            user_answer=user_answer,
             collection_name=collection_name,
-            limit=context_limit,
+            context_limit=context_limit,
             score_threshold=score_threshold,
-            query_expansion=query_expansion
+            query_expansion=query_expansion,
+            question_embedding=question_embedding,
+            context=context
         )
         
-        # Format the user prompt with all variables
-        qna_user_prompt = user_prompt.format(
+        # Send to LLM (llm function already parses JSON output, and it has 'score','reason', 'background_info', that sort of thing)
+        llm_response = llm(system_prompt, qna_user_prompt, model, temperature)
+
+    except KeyError as e:
+        llm_response = {"error": f"Missing placeholder in user_prompt template: {e}"}
+    except Exception as e:
+        llm_response = {"error": f"RAG pipeline error: {str(e)}"}
+
+    # Add metadata to response (on a template error, user_prompt is the original template, not formatted)
+    llm_response['metadata'] = _rag_metadata(
+        system_prompt, qna_user_prompt, model, temperature, context,
+        context_limit, score_threshold, query_expansion
+    )
+    return llm_response
+
+
+def rag_stream(
+    user_prompt: str,
+    system_prompt: str,
+    question: str,
+    answers: str,
+    user_state: str,
+    user_answer: str,
+    result: Dict[str, Any],
+    model: str = DEFAULT_LLM_MODEL,
+    collection_name: str = DEFAULT_COLLECTION,
+    context_limit: int = 2,
+    score_threshold: float = 0.5,
+    query_expansion: bool = False,
+    temperature: float = 0.5,
+    question_embedding: Optional[List[float]] = None,
+    context: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Streaming variant of rag(): yields the LLM response text as it is generated.
+    
+    Takes the same arguments as rag(), plus `result`: an empty dict that is filled with
+    exactly what rag() would have returned (parsed JSON or error, plus metadata) once the
+    generator is exhausted.
+    
+    Example:
+        >>> result = {}
+        >>> for text in rag_stream(..., result=result):
+        ...     print(text, end="")
+        >>> result["success"]
+    """
+    qna_user_prompt = user_prompt
+    try:
+        context, qna_user_prompt = build_rag_prompt(
+            user_prompt=user_prompt,
             question=question,
             answers=answers,
             user_state=user_state,
             user_answer=user_answer,
+            collection_name=collection_name,
+            context_limit=context_limit,
+            score_threshold=score_threshold,
+            query_expansion=query_expansion,
+            question_embedding=question_embedding,
             context=context
         )
-        
-        # Send to LLM (llm function already parses JSON output, and it has 'score','reason', 'background_info', that sort of thing)
-        llm_response=llm(system_prompt, qna_user_prompt, model, temperature)
-
-        # Add metadata to response
-        llm_response['metadata'] = {
-            'system_prompt': system_prompt,
-            'user_prompt': qna_user_prompt,
-            'model': model,
-            'temperature': temperature,
-            'context': context,
-            'context_limit': context_limit,
-            'score_threshold': score_threshold,
-            'query_expansion': query_expansion
-        }
-        
-        return llm_response
+
+        pieces = []
+        for text in llm_stream(system_prompt, qna_user_prompt, model, temperature):
+            pieces.append(text)
+            yield text
+        result.update(parse_llm_output("".join(pieces)))
 
     except KeyError as e:
-        return {
-            "error": f"Missing placeholder in user_prompt template: {e}",
-            "metadata": {
-                'system_prompt': system_prompt,
-                'user_prompt': user_prompt,  # Original template, not formatted
-                'model': model,
-                'temperature': temperature,
-                'context': context if 'context' in locals() else None,
-                'context_limit': context_limit,
-                'score_threshold': score_threshold,
-                'query_expansion': query_expansion
-            }
-        }
+        result.update({"error": f"Missing placeholder in user_prompt template: {e}"})
     except Exception as e:
-        return {
-            "error": f"RAG pipeline error: {str(e)}",
-            "metadata": {
-                'system_prompt': system_prompt,
-                'user_prompt': qna_user_prompt if 'qna_user_prompt' in locals() else user_prompt,
-                'model': model,
-                'temperature': temperature,
-                'context': context if 'context' in locals() else None,
-                'context_limit': context_limit,
-                'score_threshold': score_threshold,
-                'query_expansion': query_expansion
-            }
-        }
\ No newline at end of file
+        result.update({"error": f"RAG pipeline error: {str(e)}"})
+
+    result['metadata'] = _rag_metadata(
+        system_prompt, qna_user_prompt, model, temperature, context,
+        context_limit, score_threshold, query_expansion
+    )
+
+
+def build_rag_prompt(
+    user_prompt: str,
+    question: str,
+    answers: str,
+    user_state: str,
+    user_answer: str,
+    collection_name: str = DEFAULT_COLLECTION,
+    context_limit: int = 2,
+    score_threshold: float = 0.5,
+    query_expansion: bool = False,
+    question_embedding: Optional[List[float]] = None,
+    context: Optional[str] = None
+) -> tuple:
+    """
+    Retrieve context for the question (unless `context` is given) and fill in the user prompt template.
+    
+    Returns:
+        (context, formatted user prompt)
+    
+    Raises:
+        KeyError: If the template has a placeholder that isn't provided
+    """
+    # Get context from Qdrant (unless it was retrieved ahead of time)
+    if context is None:
+        context = get_context(
+            question=question,
+            collection_name=collection_name,
+            limit=context_limit,
+            score_threshold=score_threshold,
+            query_expansion=query_expansion,
+            query_embedding=question_embedding
+        )
+    
+    # Format the user prompt with all variables
+    qna_user_prompt = render_prompt(
+        user_prompt,
+        question=question,
+        answers=answers,
+        user_state=user_state,
+        user_answer=user_answer,
+        context=context
+    )
+    return context, qna_user_prompt
+
+
+def _rag_metadata(
+    system_prompt: str,
+    user_prompt: str,
+    model: str,
+    temperature: float,
+    context: Optional[str],
+    context_limit: int,
+    score_threshold: float,
+    query_expansion: bool
+) -> Dict[str, Any]:
+    """LLM inputs and RAG settings attached to every rag() result for logging."""
+    return {
+        'system_prompt': system_prompt,
+        'user_prompt': user_prompt,
+        'model': model,
+        'temperature': temperature,
+        'context': context,
+        'context_limit': context_limit,
+        'score_threshold': score_threshold,
+        'query_expansion': query_expansion
+    }
@@ -1,10 +1,24 @@
 import os
+import re
+import json
+import time
+import atexit
+import hashlib
 import uuid
+import threading
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool, PoolError
 import streamlit as st
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType, SimpleNamespace
 from utils.io import load_from_json
+from utils.rag import rag_stream, embed_texts, get_context
+from utils.prompts import USCIS_OFFICER_SYSTEM_PROMPT, USCIS_OFFICER_USER_PROMPT
 
 # Get project paths
 SCRIPT_DIR = Path(__file__).parent.parent.resolve()
@@ -16,7 +30,8 @@ DOCUMENTS_DIR = SCRIPT_DIR / 'documents'
 
 # US States, Territories, and D.C. - All 50 states plus Washington D.C. and 5 inhabited territories
 # Used for location selection to personalize civics questions with local officials
-US_LOCATIONS = [
+# (a tuple so it can't be mutated by accident from any session)
+US_LOCATIONS = (
     "Alabama", "Alaska", "Arizona", "Arkansas", "California", "Colorado",
     "Connecticut", "Delaware", "Florida", "Georgia", "Hawaii", "Idaho",
     "Illinois", "Indiana", "Iowa", "Kansas", "Kentucky", "Louisiana",
@@ -35,7 +50,10 @@ US_LOCATIONS = [
     "Northern Mariana Islands",
     "Puerto Rico",
     "US Virgin Islands"
-]
+)
+
+# Setup screen selectbox options: a blank "no selection yet" entry followed by every location
+LOCATION_OPTIONS = ("",) + US_LOCATIONS
 
 # RAG System Configuration
 # - context_limit: Max documents to retrieve (2)
@@ -53,19 +71,26 @@ RAG_CONFIG = {
 # 2008: 10 questions, need 6 correct (or max 4 incorrect)
 # 2025: 20 questions, need 12 correct (or max 8 incorrect)
 # Cutoff date: October 20, 2025 (determines which test to take)
-TEST_CONFIG = {
-    "2008": {
+# Read-only: the same mappings are shared by every session
+TEST_CONFIG = MappingProxyType({
+    "2008": MappingProxyType({
         "total": 10,
         "passing": 6,
         "max_incorrect": 4,  # 10 - 6
         "name": "2008 Civics Test"
-    },
-    "2025": {
+    }),
+    "2025": MappingProxyType({
         "total": 20,
         "passing": 12,
         "max_incorrect": 8,  # 20 - 12
         "name": "2025 Civics Test"
-    }
+    })
+})
+
+# (correct answers needed to pass, incorrect answers that fail the test) per test version
+COMPLETION_THRESHOLDS = {
+    year: (config["passing"], config["max_incorrect"] + 1)
+    for year, config in TEST_CONFIG.items()
 }
 
 def get_test_requirements(test_year):
@@ -75,7 +100,7 @@ def get_test_requirements(test_year):
 def reset_quiz_state():
     """Clear all quiz-related session state"""
     quiz_keys = [
-        'question',
+        'question_idx',
         'answered', 
         'total_attempted',
         'total_correct',
@@ -83,33 +108,43 @@ def reset_quiz_state():
         'result',
         'user_answer_text',
         'question_counter',
-        'asked_questions',
+        'asked_idx',
+        'rng_seed',
+        'rng',
         'test_complete',
         'test_passed', 
         'feedback_given',
+        'context_future',
+        'context_question',
     ]
     
     for key in quiz_keys:
         if key in st.session_state:
             del st.session_state[key]
 
-def check_test_completion():
-    """Check if the test WOULD BE complete based on 2008 or 2025 rules - returns True/False but doesn't set state"""
-    test_year = st.session_state.test_year
-    correct = st.session_state.total_correct
-    incorrect = st.session_state.total_incorrect
+@lru_cache(maxsize=None)
+def check_test_completion(correct, incorrect, test_year):
+    """Check if the test WOULD BE complete based on 2008 or 2025 rules - returns (test_complete, test_passed) but doesn't set state"""
+    pass_req, fail_req = COMPLETION_THRESHOLDS[test_year]
     
-    config = TEST_CONFIG[test_year]
-    
-    # Pass with enough correct answers
-    if correct >= config["passing"]:
-        return True, True  # (test_complete, test_passed)
+    # Pass with enough correct answers, fail with too many incorrect answers
+    passed = correct >= pass_req
+    return passed or incorrect >= fail_req, passed
+
+def pick_unasked_question(rng, total, asked_idx):
+    """Pick a random question index not in asked_idx, or None if every question has been asked.
+    Draws until it hits an unasked index (O(1) expected while most are unasked) and only lists
+    the remaining indices once more than half the bank has been asked"""
+    if len(asked_idx) >= total:
+        return None
     
-    # Fail with too many incorrect answers
-    elif incorrect > config["max_incorrect"]:
-        return True, False  # (test_complete, test_failed)
+    if len(asked_idx) <= total // 2:
+        while True:
+            idx = rng.randrange(total)
+            if idx not in asked_idx:
+                return idx
     
-    return False, False  # Test not complete yet
+    return rng.choice([idx for idx in range(total) if idx not in asked_idx])
 
 def reset_all_state():
     """Clear everything and go back to setup"""
@@ -121,8 +156,8 @@ def reset_all_state():
     # Clear quiz
     reset_quiz_state()
 
-def log_feedback(feedback_type):
-    """Log user feedback to Neon Postgres database with session state fallback"""
+def log_feedback(feedback_type, question, answers):
+    """Queue user feedback for the Neon Postgres database with session state fallback"""
     # Mark feedback as given to disable buttons
     st.session_state.feedback_given = True
     
@@ -138,9 +173,9 @@ def log_feedback(feedback_type):
         'timestamp': datetime.now().isoformat(),
         'user_state': st.session_state.user_state,
         'test_year': st.session_state.test_year,
-        'question': st.session_state.question.get('question', ''),
+        'question': question,
         'user_answer': st.session_state.user_answer_text,
-        'correct_answers': st.session_state.question.get('answers', ''),
+        'correct_answers': answers,
         'success': st.session_state.result.get('success', False),
         'reason': st.session_state.result.get('reason', ''),
         'background_info': st.session_state.result.get('background_info', ''),
@@ -157,23 +192,9 @@ def log_feedback(feedback_type):
         'query_expansion': llm_metadata.get('query_expansion', RAG_CONFIG['query_expansion']),
     }
     
+    # Queue the row; it is written to the database in the background together with other feedback
     try:
-        # Connect to Neon Postgres
-        conn = psycopg2.connect(st.secrets["database"]["url"])
-        cur = conn.cursor()
-        
-        # Insert feedback into database
-        cur.execute("""
-            INSERT INTO feedback (
-                timestamp, user_state, test_year, question_text, 
-                correct_answers, user_answer, success, reason, 
-                background_info, feedback_type, session_id,
-                rag_context_limit, rag_score_threshold, rag_query_expansion,
-                system_prompt, user_prompt, model, llm_temperature, context
-            ) VALUES (
-                %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
-            )
-        """, (
+        _feedback_writer().add((
             feedback_entry['timestamp'],
             feedback_entry['user_state'],
             feedback_entry['test_year'],
@@ -194,13 +215,9 @@ def log_feedback(feedback_type):
             feedback_entry['llm_temperature'],
             feedback_entry['context']
         ))
-        
-        conn.commit()
-        cur.close()
-        conn.close()
-        
+
     except Exception as e:
-        # Fallback to session state if database fails
+        # Fallback to session state if the database isn't configured
         if 'feedback_log' not in st.session_state:
             st.session_state.feedback_log = []
         
@@ -210,8 +227,288 @@ def log_feedback(feedback_type):
         # Silent fail - don't disrupt user experience
         print(f"Database logging failed, saved to session state: {e}")
 
+# Buffered feedback is written once this many rows are queued, or every FEEDBACK_FLUSH_INTERVAL seconds
+FEEDBACK_BATCH_SIZE = 32
+FEEDBACK_FLUSH_INTERVAL = 10
+# Rows kept in memory while the database is unreachable (oldest are dropped beyond this)
+FEEDBACK_BUFFER_LIMIT = 1000
+
+FEEDBACK_INSERT_SQL = """
+    INSERT INTO feedback (
+        timestamp, user_state, test_year, question_text, 
+        correct_answers, user_answer, success, reason, 
+        background_info, feedback_type, session_id,
+        rag_context_limit, rag_score_threshold, rag_query_expansion,
+        system_prompt, user_prompt, model, llm_temperature, context
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s
+    )
+"""
+
+class _FeedbackWriter:
+    """Append-only feedback buffer flushed to Neon Postgres by a background thread,
+    so a thumbs click never waits on a database round trip"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.rows = deque(maxlen=FEEDBACK_BUFFER_LIMIT)
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        threading.Thread(target=self._run, name="feedback-writer", daemon=True).start()
+        atexit.register(self.flush)
+
+    def add(self, row):
+        with self.lock:
+            self.rows.append(row)
+            pending = len(self.rows)
+        if pending >= FEEDBACK_BATCH_SIZE:
+            self.wake.set()
+
+    def _run(self):
+        while True:
+            self.wake.wait(FEEDBACK_FLUSH_INTERVAL)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every queued row in one transaction; on failure the rows stay queued for the next attempt"""
+        with self.lock:
+            batch = list(self.rows)
+            self.rows.clear()
+        if not batch:
+            return
+
+        try:
+            # `with conn` commits the batch on success and rolls it back on error
+            with db_connection(self.pool) as conn, conn, conn.cursor() as cur:
+                cur.executemany(FEEDBACK_INSERT_SQL, batch)
+
+        except Exception as e:
+            # Put the rows back in front of anything queued meanwhile; rebuilding the bounded
+            # deque keeps the newest rows (extendleft on a full deque would evict those instead)
+            with self.lock:
+                self.rows = deque(batch + list(self.rows), maxlen=FEEDBACK_BUFFER_LIMIT)
+            # Silent fail - don't disrupt user experience
+            print(f"Database logging failed, {len(batch)} feedback rows kept for retry: {e}")
+
+@st.cache_resource
+def _feedback_writer():
+    """One feedback writer shared by all sessions"""
+    return _FeedbackWriter(get_db_pool())
+
+# Most connections open at once to Neon Postgres (app, dashboard and feedback writer together)
+DB_POOL_SIZE = 10
+# Seconds a session waits for a free pooled connection before giving up
+DB_POOL_TIMEOUT = 30
+
+class _BlockingConnectionPool(ThreadedConnectionPool):
+    """ThreadedConnectionPool whose getconn() waits for a connection to be returned
+    instead of raising PoolError as soon as every connection is checked out"""
+
+    def __init__(self, minconn, maxconn, *args, **kwargs):
+        self._slots = threading.BoundedSemaphore(maxconn)
+        super().__init__(minconn, maxconn, *args, **kwargs)
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=DB_POOL_TIMEOUT):
+            raise PoolError(f"no database connection free after {DB_POOL_TIMEOUT}s")
+        try:
+            return super().getconn(key)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        finally:
+            self._slots.release()
+
+@st.cache_resource
+def get_db_pool():
+    """Connection pool to Neon Postgres shared by every session, so cache misses skip the TLS handshake and login"""
+    return _BlockingConnectionPool(0, DB_POOL_SIZE, st.secrets["database"]["url"])
+
+def get_db_connection(pool=None):
+    """Take a live connection from the pool; give it back with release_db_connection().
+    Neon closes connections that sit idle while the compute suspends, so a dead one is replaced"""
+    pool = pool or get_db_pool()
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+    except psycopg2.Error:
+        pool.putconn(conn, close=True)
+        conn = pool.getconn()
+    return conn
+
+def release_db_connection(conn, pool=None):
+    """Return a connection to the pool (anything left uncommitted is rolled back)"""
+    (pool or get_db_pool()).putconn(conn)
+
+@contextmanager
+def db_connection(pool=None):
+    """Borrow a pooled connection for a with-block; it goes back to the pool even if the block raises"""
+    pool = pool or get_db_pool()
+    conn = get_db_connection(pool)
+    try:
+        yield conn
+    finally:
+        release_db_connection(conn, pool)
+
 @st.cache_data
 def load_questions(test_year):
-    """Load the QnA related to that particular year"""
+    """Load the QnA related to that particular year as parallel sequences: text[i] is answered by answers[i]"""
     filepath = os.path.join(DOCUMENTS_DIR, f"{test_year}_civics_test_qa_pairs.json")
-    return load_from_json(filepath)
\ No newline at end of file
+    qa_pairs = load_from_json(filepath)
+    return SimpleNamespace(
+        text=tuple(qa.get('question', '') for qa in qa_pairs),
+        answers=tuple(qa.get('answers', []) for qa in qa_pairs)
+    )
+
+@st.cache_data(show_spinner=False)
+def load_question_embeddings(test_year):
+    """Embed every question of that year's test in one batched request (row i embeds question i)"""
+    return embed_texts(list(load_questions(test_year).text))
+
+# Retrieved context is shared between sessions for this long (the collection is re-ingested monthly)
+CONTEXT_CACHE_TTL = 3600
+
+@st.cache_resource
+def _retrieval_executor():
+    """Worker threads and in-flight/finished retrievals shared by all sessions: question -> (time, Future)"""
+    return {
+        'executor': ThreadPoolExecutor(max_workers=4, thread_name_prefix="context-prefetch"),
+        'lock': threading.Lock(),
+        'futures': {}
+    }
+
+def prefetch_context(question, question_embedding=None):
+    """Start retrieving the question's RAG context in the background and return its Future,
+    so retrieval overlaps with the user typing their answer. Sessions on the same question
+    share one retrieval instead of each querying Qdrant"""
+    retrieval = _retrieval_executor()
+    now = time.monotonic()
+    with retrieval['lock']:
+        entry = retrieval['futures'].get(question)
+        if entry is not None:
+            started, future = entry
+            failed = future.done() and future.exception() is not None
+            if not failed and now - started <= CONTEXT_CACHE_TTL:
+                return future
+
+        future = retrieval['executor'].submit(
+            get_context,
+            question=question,
+            limit=RAG_CONFIG['context_limit'],
+            score_threshold=RAG_CONFIG['score_threshold'],
+            query_expansion=RAG_CONFIG['query_expansion'],
+            query_embedding=question_embedding
+        )
+        retrieval['futures'][question] = (now, future)
+        return future
+
+# Successful evaluations are kept for an hour, up to this many submissions
+EVALUATION_CACHE_TTL = 3600
+EVALUATION_CACHE_SIZE = 512
+
+@st.cache_resource
+def _evaluation_cache():
+    """Cache of successful evaluations shared by all sessions: submission digest -> (time, result)"""
+    return {'lock': threading.Lock(), 'entries': OrderedDict()}
+
+def _evaluation_key(question, answers, user_state, user_answer):
+    """Fixed-size cache key for a submission: a 128-bit digest of its inputs"""
+    inputs = repr((question, tuple(answers), user_state, user_answer))
+    return hashlib.blake2b(inputs.encode("utf-8"), digest_size=16).digest()
+
+def get_cached_evaluation(question, answers, user_state, user_answer):
+    """Return the stored evaluation of an identical earlier submission, or None"""
+    cache = _evaluation_cache()
+    key = _evaluation_key(question, answers, user_state, user_answer)
+    with cache['lock']:
+        entry = cache['entries'].get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > EVALUATION_CACHE_TTL:
+            del cache['entries'][key]
+            return None
+        cache['entries'].move_to_end(key)
+        return entry[1]
+
+def _store_evaluation(question, answers, user_state, user_answer, result):
+    """Remember a successful evaluation (errors are never stored, so a retry calls the LLM again)"""
+    if 'error' in result:
+        return
+    cache = _evaluation_cache()
+    key = _evaluation_key(question, answers, user_state, user_answer)
+    with cache['lock']:
+        cache['entries'][key] = (time.monotonic(), result)
+        cache['entries'].move_to_end(key)
+        while len(cache['entries']) > EVALUATION_CACHE_SIZE:
+            cache['entries'].popitem(last=False)
+
+# Evaluation fields shown to the user while the LLM response streams in (in the order generated)
+STREAMED_EVALUATION_FIELDS = ('reason', 'background_info')
+
+def _stream_json_strings(chunks, fields):
+    """Yield the decoded text of the given string fields as they arrive in a streamed JSON object,
+    each field's text separated by a blank line; the JSON syntax and any other fields are left out"""
+    key_pattern = re.compile(r'"(%s)"\s*:\s*"' % '|'.join(map(re.escape, fields)))
+    raw_string = re.compile(r'(?:[^"\\]|\\.)*')
+    text = ''
+    search_from = 0
+    start = None  # where the value of the field being streamed begins
+    shown = 0     # characters of that value already yielded
+    first = True
+    
+    for chunk in chunks:
+        text += chunk
+        while True:
+            if start is None:
+                match = key_pattern.search(text, search_from)
+                if match is None:
+                    break
+                start, shown = match.end(), 0
+                if not first:
+                    yield "\n\n"
+                first = False
+            
+            # Raw value so far; it is complete once an unescaped closing quote has arrived
+            end = raw_string.match(text, start).end()
+            complete = text[end:end + 1] == '"'
+            raw = text[start:end]
+            
+            # Drop a half-received escape sequence (e.g. the start of \u00e9) until the rest arrives
+            for cut in range(6):
+                try:
+                    value = json.loads('"' + raw[:len(raw) - cut] + '"')
+                    break
+                except ValueError:
+                    value = None
+            if value is not None and len(value) > shown:
+                yield value[shown:]
+                shown = len(value)
+            
+            if not complete:
+                break
+            search_from, start = end + 1, None
+
+def stream_evaluation(question, answers, user_state, user_answer, result, question_embedding=None, context=None):
+    """Grade the user's answer, yielding the reason and background text as the LLM generates them
+    (for st.write_stream). `result` is filled with the parsed evaluation (or error) and its metadata
+    once the stream is exhausted"""
+    yield from _stream_json_strings(rag_stream(
+        user_prompt=USCIS_OFFICER_USER_PROMPT,
+        system_prompt=USCIS_OFFICER_SYSTEM_PROMPT,
+        question=question,
+        answers=answers,
+        user_state=user_state,
+        user_answer=user_answer,
+        result=result,
+        question_embedding=question_embedding,
+        context=context,
+        **RAG_CONFIG
+    ), STREAMED_EVALUATION_FIELDS)
+    _store_evaluation(question, answers, user_state, user_answer, result)